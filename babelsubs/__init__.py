@@ -28,37 +28,74 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+from itertools import chain
+import multiprocessing
 import os
 import babelsubs.parsers as parsers
-from babelsubs.parsers.base import ParserList, SubtitleParserError
-from babelsubs.generators.base import GeneratorList
+from babelsubs.parsers.base import (
+    ParserList, SubtitleParserError, detect_format, SNIFF_SIZE
+)
+from babelsubs.generators.base import GeneratorList, generate_many
 import babelsubs.generators as generators
 
 def get_available_formats():
     return sorted(list(set(ParserList.keys()).intersection(set(GeneratorList.keys()))))
 
+def guess_type(content, extension=None):
+    """
+    Returns the type content looks like, see detect_format().
+    When the content looks like the format of the extension too, or doesn't
+    look like any format, the extension wins.
+    """
+    guesses = detect_format(content)
+    if extension and extension.lower() in ParserList:
+        parser = ParserList[extension]
+        if not guesses or parser in [ParserList[g] for g in guesses]:
+            return extension
+    if guesses:
+        return guesses[0]
+    return None
+
+def _guess_stream_type(stream, extension):
+    try:
+        position = stream.tell()
+        head = stream.read(SNIFF_SIZE)
+        stream.seek(position)
+    except (AttributeError, IOError):
+        # can't rewind, we'll have to trust the extension
+        return extension
+    return guess_type(head, extension)
+
 def load_from(sub_from, type=None, language=None):
     if hasattr(sub_from, 'read'):
-        if type is None and not getattr(sub_from, 'name', None):
-            raise TypeError("Couldn't find out the type by myself. Care to specify?")
-
-        extension = sub_from.name.split(".")[-1]
-        # if the file extension is not given or is not a registred
-        # fallback to the given type
-        available_types = get_available_formats()
+        name = getattr(sub_from, 'name', None)
+        extension = name.split(".")[-1] if name else None
+        if type is None:
+            type = _guess_stream_type(sub_from, extension)
+            if type is None:
+                raise TypeError("Couldn't find out the type by myself. Care to specify?")
+
+        # if the type given is not a registred one fallback to the file
+        # extension.  Formats we can only read (youtube) are fine too.
+        available_types = ParserList.keys()
         target_type = None
-        if type and type in available_types:
+        if type in available_types:
             target_type = type
         elif extension and extension in available_types:
             target_type = extension
         else: 
             raise TypeError("Type %s is not an available type"  % (type or extension))
         parser = parsers.discover(target_type) 
+        if getattr(parser, 'ACCEPTS_STREAMS', False):
+            with sub_from:
+                return parser.parse(sub_from, language=language)
         with sub_from:
             sub_from = sub_from.read()
-    elif isinstance(sub_from, basestring) and type is None:
-        raise TypeError("Couldn't find out the type by myself. Care to specify?")
     else:
+        if type is None:
+            type = guess_type(sub_from)
+            if type is None:
+                raise TypeError("Couldn't find out the type by myself. Care to specify?")
         parser = parsers.discover(type)
 
     no_unicode = getattr(parser, 'NO_UNICODE', False)
@@ -72,6 +109,64 @@ def load_from(sub_from, type=None, language=None):
 
     return parser.parse(sub_from, language=language)
 
+# parse_parallel() doesn't bother cutting pieces smaller than this
+PARALLEL_CHUNK_SIZE = 1 << 16
+
+def _split_at_boundaries(content, boundary_re, count, min_size):
+    size = max(min_size, len(content) // count)
+    start = 0
+    while True:
+        match = boundary_re.search(content, start + size)
+        if match is None:
+            yield content[start:]
+            return
+        yield content[start:match.end()]
+        start = match.end()
+
+def _parse_chunk(args):
+    type, chunk, language = args
+    parser = parsers.discover(type)(chunk, language, eager_parse=False)
+    return list(parser._subtitle_tuples())
+
+def parse_parallel(content, type, workers=None, language=None,
+                   chunk_size=PARALLEL_CHUNK_SIZE):
+    """
+    Parse subtitles in a pool of `workers` processes (one per CPU by
+    default), returns the subtitle set.
+    Only formats whose parser knows where cues begin (CHUNK_BOUNDARY_RE: srt,
+    vtt, sbv and ssa) get cut in pieces, the others and content shorter than
+    chunk_size are parsed here as load_from() would.
+    """
+    parser = parsers.discover(type)
+    if not isinstance(content, unicode):
+        content = content.decode("utf-8")
+    content = content.replace('\r\n', '\n')
+    workers = workers or multiprocessing.cpu_count()
+    if (parser.CHUNK_BOUNDARY_RE is None or workers < 2
+            or len(content) < chunk_size * 2):
+        return load_from(content, type, language).to_internal()
+
+    # a few chunks per worker, so that they all keep busy till the end
+    chunks = _split_at_boundaries(content, parser.CHUNK_BOUNDARY_RE,
+                                  workers * 4, chunk_size)
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_parse_chunk,
+                           [(type, chunk, language) for chunk in chunks],
+                           chunksize=1)
+        pool.close()
+    except Exception as e:
+        pool.terminate()
+        raise SubtitleParserError(original_error=e)
+    finally:
+        pool.join()
+
+    subtitle_set = parser.SUBTITLE_SET_CLASS(language)
+    subtitle_set.extend(chain.from_iterable(results), escape=False)
+    if not len(subtitle_set):
+        raise SubtitleParserError(original_error=ValueError("No subs found"))
+    return subtitle_set
+
 def load_from_file(filename, type=None, language=None):
     if not os.path.isfile(filename):
         raise ValueError('Invalid filename "%s".' % filename)
@@ -88,8 +183,38 @@ def to(subs, type, language=None):
 
     return Generator.generate(subs, language=language)
 
+def to_stream(subs, type, stream, language=None, encoding='utf-8'):
+    """
+    Like to(), but writes the encoded output to the file-like object stream
+    cue by cue instead of building one big string.
+    """
+    Generator = generators.discover(type)
+
+    if not Generator:
+        raise TypeError("Could not find a type %s" % type)
+
+    Generator(subs, language=language).generate_to(stream, encoding=encoding)
+
+def export_many(subs, types, language=None):
+    """
+    Generate subs in each of types, e.g. ['srt', 'vtt', 'dfxp'].
+
+    Returns a dict mapping each type to its output, the same as calling
+    to() for each one, but the subtitles are only walked once.
+    """
+    Generators = []
+    for type in types:
+        Generator = generators.discover(type)
+        if not Generator:
+            raise TypeError("Could not find a type %s" % type)
+        Generators.append(Generator)
+
+    outputs = generate_many(subs, Generators, language=language)
+    return dict(zip(types, outputs))
+
 def dfxp_merge(subtitle_sets):
     return generators.DFXPGenerator.merge_subtitles(subtitle_sets)
 
-__all__ = ['load_from', 'load_from_file', 'to', 'get_available_formats',
-           'dfxp_merge']
+__all__ = ['load_from', 'load_from_file', 'to', 'to_stream', 'export_many',
+           'get_available_formats',
+           'dfxp_merge', 'detect_format', 'guess_type', 'parse_parallel']
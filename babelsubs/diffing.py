@@ -0,0 +1,296 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2012 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""babelsubs.diffing -- sequence diffs for subtitle revisions.
+
+SequenceDiff is a drop-in replacement for the parts of
+difflib.SequenceMatcher we use (get_matching_blocks(), get_opcodes() and
+ratio()).  SequenceMatcher is quadratic in the worst case and its autojunk
+heuristic kicks in for sequences over 200 items, both of which hurt on
+feature length subtitles.
+
+The diff works on ranges of the two sequences, starting with the whole
+thing:
+    - common prefixes and suffixes are matched right away
+    - items that appear exactly once in both ranges are used as anchors
+      (patience diff), the longest increasing run of them is matched and
+      the ranges between them are diffed on their own
+    - ranges without anchors are split with Myers' O(ND) middle snake
+      bisection, which only needs O(N + M) memory.  Like GNU diff, we give
+      up on an optimal split once the edit cost gets over a limit and cut
+      at the furthest point reached instead, so ranges with lots of
+      repeated items (and no anchors) don't take O(N * D) time.
+"""
+
+from bisect import bisect_left
+import math
+
+# minimum edit cost _bisect() looks at before cutting its search short
+MIN_COST_LIMIT = 64
+
+class SequenceDiff(object):
+    def __init__(self, a, b):
+        """a and b are sequences of hashable items."""
+        self.a = a
+        self.b = b
+        self._matching_blocks = None
+
+    def _intern(self):
+        # compare small ints instead of whatever the items are
+        ids = {}
+        a = [ids.setdefault(item, len(ids)) for item in self.a]
+        b = [ids.setdefault(item, len(ids)) for item in self.b]
+        return a, b
+
+    def get_matching_blocks(self):
+        """Return a list of (i, j, n) triples, like SequenceMatcher does.
+
+        a[i:i+n] == b[j:j+n] for each triple, and the last one is always
+        (len(a), len(b), 0).
+        """
+        if self._matching_blocks is not None:
+            return self._matching_blocks
+
+        a, b = self._intern()
+        matches = []
+        ranges = [(0, len(a), 0, len(b))]
+        while ranges:
+            alo, ahi, blo, bhi = ranges.pop()
+            # common prefix
+            while alo < ahi and blo < bhi and a[alo] == b[blo]:
+                matches.append((alo, blo))
+                alo += 1
+                blo += 1
+            # common suffix
+            while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+                ahi -= 1
+                bhi -= 1
+                matches.append((ahi, bhi))
+            if alo == ahi or blo == bhi:
+                continue
+            ranges.extend(self._split(a, alo, ahi, b, blo, bhi, matches))
+
+        matches.sort()
+        blocks = []
+        for i, j in matches:
+            if blocks:
+                last_i, last_j, size = blocks[-1]
+                if last_i + size == i and last_j + size == j:
+                    blocks[-1] = (last_i, last_j, size + 1)
+                    continue
+            blocks.append((i, j, 1))
+        blocks.append((len(a), len(b), 0))
+        self._matching_blocks = blocks
+        return blocks
+
+    def _split(self, a, alo, ahi, b, blo, bhi, matches):
+        """Split a range that has no common prefix or suffix.
+
+        Returns the sub ranges that still need to be diffed, appending any
+        matches found on the way to matches.
+        """
+        anchors = _patience_anchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            ranges = []
+            for i, j in anchors:
+                matches.append((i, j))
+                ranges.append((alo, i, blo, j))
+                alo, blo = i + 1, j + 1
+            ranges.append((alo, ahi, blo, bhi))
+            return ranges
+
+        if not set(a[alo:ahi]).intersection(b[blo:bhi]):
+            # nothing in common, don't bother looking for a path
+            return []
+        split = _bisect(a, alo, ahi, b, blo, bhi)
+        if split is None:
+            return []
+        x, y = split
+        return [(alo, x, blo, y), (x, ahi, y, bhi)]
+
+    def get_opcodes(self):
+        """Return (tag, i1, i2, j1, j2) tuples, like SequenceMatcher does."""
+        i = j = 0
+        opcodes = []
+        for ai, bj, size in self.get_matching_blocks():
+            tag = ''
+            if i < ai and j < bj:
+                tag = 'replace'
+            elif i < ai:
+                tag = 'delete'
+            elif j < bj:
+                tag = 'insert'
+            if tag:
+                opcodes.append((tag, i, ai, j, bj))
+            i, j = ai + size, bj + size
+            if size:
+                opcodes.append(('equal', ai, i, bj, j))
+        return opcodes
+
+    def ratio(self):
+        """Similarity between 0 and 1, computed as 2 * matches / total."""
+        total = len(self.a) + len(self.b)
+        if not total:
+            return 1.0
+        matches = sum(size for _, _, size in self.get_matching_blocks())
+        return 2.0 * matches / total
+
+def _patience_anchors(a, alo, ahi, b, blo, bhi):
+    """Find the longest run of items unique to both ranges, in order.
+
+    Returns a list of (i, j) pairs with increasing i and j.
+    """
+    counts = {}
+    for i in xrange(alo, ahi):
+        item = a[i]
+        if item in counts:
+            counts[item] = None
+        else:
+            counts[item] = i
+    b_positions = {}
+    for j in xrange(blo, bhi):
+        item = b[j]
+        if counts.get(item) is None:
+            continue
+        if item in b_positions:
+            b_positions[item] = None
+        else:
+            b_positions[item] = j
+    pairs = sorted((counts[item], j) for item, j in b_positions.iteritems()
+                   if j is not None)
+    if not pairs:
+        return []
+
+    # longest increasing subsequence of the b positions (patience sorting)
+    tops = []
+    top_indexes = []
+    previous = [None] * len(pairs)
+    for index, (i, j) in enumerate(pairs):
+        pile = bisect_left(tops, j)
+        if pile == len(tops):
+            tops.append(j)
+            top_indexes.append(index)
+        else:
+            tops[pile] = j
+            top_indexes[pile] = index
+        previous[index] = top_indexes[pile - 1] if pile else None
+    result = []
+    index = top_indexes[-1]
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+def _bisect(a, alo, ahi, b, blo, bhi):
+    """Find a point on an optimal edit path through the ranges.
+
+    This is Myers' middle snake search, walking forward from the start and
+    backwards from the end until the two meet.  Only the two V arrays are
+    kept, so memory stays linear in the size of the ranges.
+
+    Once the cost goes over the limit the split point isn't optimal
+    anymore: we cut at the end of the path that got the furthest.
+
+    Returns an (i, j) split point, or None if there is nothing in common.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    cost_limit = max(MIN_COST_LIMIT, int(math.sqrt(n + m)))
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    # if the total number of items is odd, the forward path collides with
+    # the backward one, otherwise the other way around
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in xrange(max_d):
+        for k1 in xrange(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and
+                            v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                # ran off the right of the graph
+                k1end += 2
+            elif y1 > m:
+                # ran off the bottom of the graph
+                k1start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return _split_point(alo, ahi, blo, bhi, x1, y1)
+
+        for k2 in xrange(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and
+                            v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while (x2 < n and y2 < m and
+                   a[ahi - x2 - 1] == b[bhi - y2 - 1]):
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = x1 - (k1_offset - v_offset)
+                    if x1 >= n - x2:
+                        return _split_point(alo, ahi, blo, bhi, x1, y1)
+
+        if d >= cost_limit:
+            # too expensive, settle for the furthest point either path got to
+            best, x, y = -1, 0, 0
+            for k1 in xrange(-d + k1start, d + 1 - k1end, 2):
+                x1 = v1[v_offset + k1]
+                y1 = x1 - k1
+                if x1 <= n and 0 <= y1 <= m and x1 + y1 > best:
+                    best, x, y = x1 + y1, x1, y1
+            for k2 in xrange(-d + k2start, d + 1 - k2end, 2):
+                x2 = v2[v_offset + k2]
+                y2 = x2 - k2
+                if x2 <= n and 0 <= y2 <= m and x2 + y2 > best:
+                    best, x, y = x2 + y2, n - x2, m - y2
+            return _split_point(alo, ahi, blo, bhi, x, y)
+    return None
+
+def _split_point(alo, ahi, blo, bhi, x, y):
+    if (x, y) in ((0, 0), (ahi - alo, bhi - blo)):
+        # splitting there would not make the problem any smaller
+        return None
+    return alo + x, blo + y
@@ -1,3 +1,5 @@
+from itertools import izip
+
 from babelsubs.utils import UNSYNCED_TIME_FULL
 
 class BaseGenerator(object):
@@ -14,8 +16,23 @@ class BaseGenerator(object):
         self.language = language
 
     def __unicode__(self):
+        return u''.join(self.iter_generate())
+
+    def iter_generate(self):
+        """
+        Yield the output as unicode chunks, roughly one per cue.
+
+        Joining the chunks gives the same text as unicode(generator).
+        """
         raise Exception('Should return subtitles')
 
+    def generate_to(self, stream, encoding='utf-8'):
+        """
+        Write the output to a file-like object as it is produced.
+        """
+        for chunk in self.iter_generate():
+            stream.write(chunk.encode(encoding))
+
     @classmethod
     def isnumber(cls, val):
         return isinstance(val, (int, long, float))
@@ -24,6 +41,60 @@ class BaseGenerator(object):
     def generate(cls, subtitle_set, language=None):
         return unicode(cls(subtitle_set, language=language))
 
+class _PrecomputedItemsSet(object):
+    """
+    Stands in for a subtitle set, serving subtitle items that were
+    extracted beforehand for a list of mappings.
+
+    Anything else, including items for other mappings, comes from the real
+    subtitle set.
+    """
+    def __init__(self, subtitle_set, mappings_list, items_list):
+        self._subtitle_set = subtitle_set
+        self._items = zip(mappings_list, items_list)
+
+    def __getattr__(self, name):
+        return getattr(self._subtitle_set, name)
+
+    def __len__(self):
+        return len(self._subtitle_set)
+
+    def _items_for(self, mappings):
+        for item_mappings, items in self._items:
+            if item_mappings == mappings:
+                return items
+        return None
+
+    def subtitle_items(self, mappings=None):
+        items = self._items_for(mappings)
+        if items is None:
+            return self._subtitle_set.subtitle_items(mappings)
+        return list(items)
+
+    def iter_subtitle_items(self, mappings=None):
+        items = self._items_for(mappings)
+        if items is None:
+            return self._subtitle_set.iter_subtitle_items(mappings)
+        return iter(items)
+
+def generate_many(subtitle_set, generator_classes, language=None):
+    """
+    Run each of generator_classes over subtitle_set and return the outputs,
+    in order.
+
+    The subtitles are walked once for all the generators; the text of each
+    subtitle is extracted once per distinct MAPPINGS.
+    """
+    mappings_list = [Generator.MAPPINGS for Generator in generator_classes
+                     if hasattr(Generator, 'MAPPINGS')]
+    items_list = [[] for mappings in mappings_list]
+    for items in subtitle_set.iter_subtitle_items_for(mappings_list):
+        for column, item in izip(items_list, items):
+            column.append(item)
+    items_set = _PrecomputedItemsSet(subtitle_set, mappings_list, items_list)
+    return [unicode(Generator(items_set, language=language))
+            for Generator in generator_classes]
+
 class GeneratorListClass(dict):
 
     def register(self, handler, type=None):
@@ -16,8 +16,9 @@ class DFXPGenerator(BaseGenerator):
         super(DFXPGenerator, self).__init__(subtitle_set, line_delimiter,
                 language)
 
-    def __unicode__(self):
-        return self.subtitle_set.to_xml()
+    def iter_generate(self):
+        # the TTML document is serialized by lxml in one go
+        yield self.subtitle_set.to_xml()
 
     @classmethod
     def generate(cls, subtitle_set, language=None):
@@ -14,19 +14,20 @@ class HTMLGenerator(BaseGenerator):
         super(HTMLGenerator, self).__init__(subtitle_set, language)
         self.line_delimiter = '\r\n'
 
-    def __unicode__(self):
-        output = []
+    def iter_generate(self):
+        ld = self.line_delimiter
         i = 1
-        for from_ms, to_ms, content, meta in self.subtitle_set.subtitle_items(mappings=self.MAPPINGS):
-            output.append(unicode(i))
-            output.append(u'%s --> %s' % (
-                self.format_time(from_ms),
-                self.format_time(to_ms)
-                ))
-            output.append(content)
-            output.append(u'')
+        for from_ms, to_ms, content, meta in self.subtitle_set.iter_subtitle_items(mappings=self.MAPPINGS):
+            separator = ld if i > 1 else u''
+            yield separator + ld.join([
+                unicode(i),
+                u'%s --> %s' % (
+                    self.format_time(from_ms),
+                    self.format_time(to_ms)
+                    ),
+                content,
+                u''])
             i += 1
-        return self.line_delimiter.join(output)
 
     def format_time(self, milliseconds):
         if milliseconds is None:
@@ -21,12 +21,13 @@ class JSONGenerator(BaseGenerator):
                     italics="<i>%s</i>", underline="<u>%s</u>",
                     quote_text=escape)
 
-    def __unicode__(self):
-        output = []
+    def iter_generate(self):
         # FIXME: allow formatting tags
+        # the array is written an item at a time, laid out just like
+        # json.dumps() would lay out the whole list
         i = 1
-        for from_ms, to_ms, content, meta in self.subtitle_set.subtitle_items(mappings=self.MAPPINGS):
-            output.append({
+        for from_ms, to_ms, content, meta in self.subtitle_set.iter_subtitle_items(mappings=self.MAPPINGS):
+            yield (u'[' if i == 1 else u', ') + json.dumps({
                 'start': from_ms,
                 'end': to_ms,
                 'text': content,
@@ -34,7 +35,7 @@ class JSONGenerator(BaseGenerator):
                 'meta': meta
             })
             i += 1
-        return json.dumps(output)
+        yield u'[]' if i == 1 else u']'
 
 
 register(JSONGenerator)
@@ -10,17 +10,16 @@ class SBVGenerator(BaseGenerator):
         super(SBVGenerator, self).__init__(subtitles_set, line_delimiter,
                 language)
 
-    def __unicode__(self):
-        output = []
+    def iter_generate(self):
+        ld = self.line_delimiter
+        separator = u''
 
-        for from_ms, to_ms, content, meta in self.subtitle_set.subtitle_items(self.MAPPINGS):
+        for from_ms, to_ms, content, meta in self.subtitle_set.iter_subtitle_items(self.MAPPINGS):
             start = self.format_time(from_ms)
             end = self.format_time(to_ms)
-            output.append(u'%s,%s' % (start, end))
-            output.append(content.strip())
-            output.append(u'')
-
-        return self.line_delimiter.join(output)
+            yield separator + ld.join([u'%s,%s' % (start, end),
+                                       content.strip(), u''])
+            separator = ld
 
     def format_time(self, time):
         if time is None:
@@ -10,9 +10,13 @@ class SSAGenerator(BaseGenerator):
                     linebreaks="\N")
 
 
-    def __unicode__(self):
+    def iter_generate(self):
         #add BOM to fix python default behaviour, because players don't play without it
-        return u''.join([unicode(codecs.BOM_UTF8, "utf8"), self._start(), self._content(), self._end()])
+        yield unicode(codecs.BOM_UTF8, "utf8")
+        yield self._start()
+        for line in self._iter_content():
+            yield line
+        yield self._end()
 
     def _start(self):
         ld = self.line_delimiter
@@ -35,18 +39,18 @@ class SSAGenerator(BaseGenerator):
         return text.replace('\n', ' ')
 
     def _content(self):
+        return u''.join(self._iter_content())
+
+    def _iter_content(self):
         dl = self.line_delimiter
-        output = []
-        output.append(u'[Events]%s' % dl)
-        output.append(u'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text%s' % dl)
+        yield u'[Events]%s' % dl
+        yield u'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text%s' % dl
         tpl = u'Dialogue: 0,%s,%s,Default,,0000,0000,0000,,%s%s'
 
-        for from_ms, to_ms, content, meta in self.subtitle_set.subtitle_items(self.MAPPINGS):
+        for from_ms, to_ms, content, meta in self.subtitle_set.iter_subtitle_items(self.MAPPINGS):
             start = self.format_time(from_ms)
             end = self.format_time(to_ms)
             text = self._clean_text(content)
-            output.append(tpl % (start, end, text, dl))
-
-        return ''.join(output)
+            yield tpl % (start, end, text, dl)
 
 register(SSAGenerator)
@@ -13,15 +13,14 @@ class TXTGenerator(BaseGenerator):
         self.line_delimiter = line_delimiter
         self.language = language
 
-    def __unicode__(self):
-        output = []
-        items = self.subtitle_set.subtitle_items(mappings=self.MAPPINGS)
+    def iter_generate(self):
+        items = self.subtitle_set.iter_subtitle_items(mappings=self.MAPPINGS)
+        separator = u''
 
         for _, _, content, _ in items:
             if content:
-                output.append(content.strip())
-
-        return self.line_delimiter.join(output)
+                yield separator + content.strip()
+                separator = self.line_delimiter
 
 
 register(TXTGenerator)
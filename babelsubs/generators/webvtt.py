@@ -15,17 +15,20 @@ class WEBVTTGenerator(BaseGenerator):
         super(WEBVTTGenerator, self).__init__(subtitle_set, language)
         self.line_delimiter = '\n'
 
-    def __unicode__(self):
-        output = ['WEBVTT\n']
-        for sub in self.subtitle_set.subtitle_items(mappings=self.MAPPINGS):
+    def iter_generate(self):
+        ld = self.line_delimiter
+        # every cue is preceded by a blank line and the file has no trailing
+        # newline
+        yield u'WEBVTT'
+        for sub in self.subtitle_set.iter_subtitle_items(mappings=self.MAPPINGS):
+            output = [u'']
             if sub.new_paragraph:
                 output.append(u'NOTE Paragraph')
                 output.append(u'')
 
             output.append(self.format_cue_header(sub))
             output.append(sub.text)
-            output.append(u'')
-        return self.line_delimiter.join(output)[:-1]
+            yield ld + ld.join(output)
 
     def format_cue_header(self, sub):
         parts = []
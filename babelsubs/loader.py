@@ -176,6 +176,7 @@ class SubtitleLoader(object):
     def _remove_intial_div(self, subtitle_set):
         body = subtitle_set._ttml.find(TTML + 'body')
         body.remove(body[0])
+        subtitle_set.invalidate_cache()
 
     def _move_elements(self, source, dest):
         """Move children from one etree element to another."""
@@ -1,4 +1,4 @@
-from base import discover, SubtitleParserError
+from base import discover, detect_format, SubtitleParserError
 
 from dfxp import DFXPParser
 from sbv import SBVParser
@@ -1,11 +1,84 @@
+import codecs
+from collections import deque
+from itertools import chain, islice
 import re
-from babelsubs.storage import SubtitleSet
+from babelsubs.storage import ColumnarSubtitleSet, REGION_META_KEY
+
+_DIGITS = '0123456789'
+
+def iter_lines(stream):
+    """Iterate over the lines of a file-like object as unicode strings.
+
+    The line endings (Unix, Windows or old Mac ones) get stripped.
+    """
+    for line in stream:
+        if not isinstance(line, unicode):
+            line = line.decode('utf-8')
+        if line.endswith('\n'):
+            line = line[:-1]
+        if line.endswith('\r'):
+            line = line[:-1]
+        for part in line.split('\r'):
+            yield part
+
+def iter_timed_cues(lines, match_timing, after_index=False):
+    """Find the cues in an iterable of lines.
+
+    A cue is a line match_timing() matches, followed by its text up to the
+    next empty line.  Yields the groupdict() of the timing match with the
+    text added ('text' is None for cues without any).
+
+    With after_index the timing line must follow a line ending with a number
+    (blank lines in between are fine), like the counter in SRT.
+
+    Each line is looked at once, with match_timing() being the only regex,
+    and only the text of the current cue is kept around.  So this takes
+    linear time whatever the input, unlike a DOTALL pattern looking for the
+    blank line after the cue.
+    """
+    index_seen = not after_index
+    match = None
+    text = None
+    for line in lines:
+        if match is not None:
+            if line:
+                text.append(line)
+                continue
+            match['text'] = '\n'.join(text) or None
+            yield match
+            match = None
+            index_seen = not after_index
+            continue
+        timing = index_seen and match_timing(line)
+        if timing:
+            match = timing.groupdict()
+            text = []
+        elif after_index and line.strip():
+            index_seen = line.rstrip()[-1] in _DIGITS
+    if match is not None:
+        match['text'] = '\n'.join(text) or None
+        yield match
 
 class BaseTextParser(object):
     # xml based formats must let encoding handling to the xml parser
     # as the encoding will be declared on the root el. All other
     # parsers should allow unicode
     NO_UNICODE = False
+    # text based formats don't need a TTML tree to be converted to one another
+    # so we store them in columns, the tree gets built only if asked for.
+    SUBTITLE_SET_CLASS = ColumnarSubtitleSet
+    # (regex, score) pairs detect_format() searches the start of the content
+    # for, a higher score meaning it's more likely to be in this format
+    CONTENT_PATTERNS = ()
+    # where the input can be cut in pieces that parse to the same cues as the
+    # whole, for parse_parallel().  None if we don't know.
+    CHUNK_BOUNDARY_RE = None
+    # the match dicts found so far and the iterator giving us the rest, see
+    # _iter_matches()
+    _match_cache = None
+    _match_source = None
+    # match dicts read from a stream but not handed out yet
+    _match_pending = ()
 
     def __init__(self, input_string, pattern, language=None, flags=[], eager_parse=True):
         '''
@@ -13,22 +86,75 @@ class BaseTextParser(object):
         internal storage format, else only if you call `to_internal` directly (or `to`).
         Any errors during parsing will be of SubtitleParserError.
         Note that a file with no valid subs will be an error.
+        Without `eager_parse` only the header gets checked, the cues get decoded
+        as they are asked for (iterating, indexing or slicing the parser).
         '''
         self.input_string = input_string
         self.pattern = pattern
         self.language = language
         self._pattern = re.compile(pattern, *flags)
+        self._parse_or_check_header(eager_parse)
+
+    def _parse_or_check_header(self, eager_parse):
         if eager_parse:
             self.to_internal()
+        else:
+            self._check_header()
+
+    def _check_header(self):
+        '''
+        Raise SubtitleParserError if the input can't be in this format.
+        Only look at the start of the input, this is all the checking a lazy
+        parser does up front.
+        '''
 
     def __iter__(self):
         return self._result_iter()
 
     def __len__(self):
-        return len(self._pattern.findall(self.input_string))
+        if self._reads_stream() and hasattr(self, 'sub_set'):
+            # the stream has been read into the set already
+            return len(self.sub_set)
+        if self._reads_stream():
+            # counting reads the stream to the end, keep the cues for later
+            self._match_pending = deque(self._iter_matches())
+            return len(self._match_pending)
+        if self._match_cache is not None and self._match_source is None:
+            # scanned to the end already
+            return len(self._match_cache)
+        return sum(1 for match in self._iter_matches())
 
     def __nonzero__(self):
-        return bool(self._pattern.search(self.input_string))
+        if self._reads_stream() and hasattr(self, 'sub_set'):
+            return bool(len(self.sub_set))
+        for match in self._iter_matches():
+            if self._reads_stream():
+                # the stream can't be read again, keep the cue for later
+                self._match_pending = deque(chain([match],
+                                                  self._match_pending))
+            return True
+        return False
+
+    def __getitem__(self, key):
+        '''
+        Returns the cue (see _result_iter()) at index key, or a list of them
+        for a slice.  The input is only scanned as far as needed and only the
+        cues asked for get decoded.  Negative indexes need a full scan.
+        '''
+        if isinstance(key, slice):
+            if ((key.start or 0) < 0 or (key.stop or 0) < 0
+                    or (key.step or 1) < 0):
+                matches = list(self._iter_matches())[key]
+            else:
+                matches = islice(self._iter_matches(), key.start, key.stop,
+                                 key.step)
+            return [self._get_data(match) for match in matches]
+        if key < 0:
+            key += len(self)
+        if key >= 0:
+            for match in islice(self._iter_matches(), key, None):
+                return self._get_data(match)
+        raise IndexError("cue index out of range")
 
     def _result_iter(self):
         """
@@ -40,16 +166,64 @@ class BaseTextParser(object):
         }
         start_time and end_time in seconds. If it is not defined use -1.
         """
-        for item in self._matches:
-            yield self._get_data(item.groupdict())
+        for match in self._iter_matches():
+            yield self._get_data(match)
+
+    def _reads_stream(self):
+        """True if the cues come from a file-like object."""
+        return False
+
+    def _iter_matches(self):
+        """Iterate over _match_dicts(), scanning the input only once.
+
+        The matches get cached as they are found, so checking the parser
+        with bool() only scans up to the first cue, and len(), iterating or
+        to_internal() afterwards pick up from there.
+
+        A stream can only be read once, so its matches aren't cached at all:
+        every cue comes out a single time, in order.
+        """
+        if self._reads_stream():
+            if self._match_source is None:
+                self._match_source = self._match_dicts()
+            while self._match_pending:
+                yield self._match_pending.popleft()
+            for match in self._match_source:
+                yield match
+            return
+
+        if self._match_cache is None:
+            self._match_cache = []
+            self._match_source = self._match_dicts()
+        cache = self._match_cache
+        i = 0
+        while True:
+            if i < len(cache):
+                yield cache[i]
+                i += 1
+            elif self._match_source is None:
+                return
+            else:
+                try:
+                    cache.append(next(self._match_source))
+                except StopIteration:
+                    self._match_source = None
+
+    def _match_dicts(self):
+        """Iterate over the groupdict() of every cue found in the input."""
+        for match in self._matches:
+            yield match.groupdict()
 
     def _get_data(self, match):
         return match
 
-    def _get_matches(self):
+    def _get_input_string(self):
         if not isinstance(self.input_string, unicode) and not self.NO_UNICODE:
             self.input_string = self.input_string.decode('utf-8')
-        return self._pattern.finditer(self.input_string)
+        return self.input_string
+
+    def _get_matches(self):
+        return self._pattern.finditer(self._get_input_string())
 
     def __unicode__(self):
         return self.to(self.file_type)
@@ -67,22 +241,22 @@ class BaseTextParser(object):
 
     def to_internal(self):
         if not hasattr(self, 'sub_set'):
-            match = None
             try:
-                self.sub_set = SubtitleSet(self.language)
-                for match in self._matches:
-                    item = self._get_data(match.groupdict())
-                    text = self.get_markup(item['text'])
-                    self.sub_set.append_subtitle(
-                        item['start'], item['end'], text,
-                        region=item.get('region'), escape=False)
-                if match is None:
+                self.sub_set = self.SUBTITLE_SET_CLASS(self.language)
+                self.sub_set.extend(self._subtitle_tuples(), escape=False)
+                if not len(self.sub_set):
                     raise ValueError("No subs found")
             except Exception as e:
                 raise SubtitleParserError(original_error=e)
 
         return self.sub_set
 
+    def _subtitle_tuples(self):
+        # what to pass to the extend() of our subtitle set
+        for item in self._result_iter():
+            yield (item['start'], item['end'], self.get_markup(item['text']),
+                   {REGION_META_KEY: item.get('region')})
+
     def get_markup(self, text):
         return text.replace("\n", '<br/>')
 
@@ -118,3 +292,35 @@ def register(parser):
 
 def discover(type):
     return ParserList[type]
+
+# how many characters detect_format() looks at
+SNIFF_SIZE = 4096
+
+def _content_head(content):
+    head = content[:SNIFF_SIZE]
+    if not isinstance(head, unicode):
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            head = head.decode('utf-16', 'ignore')
+        else:
+            # the last character might have been cut in half
+            head = head.decode('utf-8', 'ignore')
+    return head.lstrip(u'\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+
+def detect_format(content):
+    '''
+    Guesses the format of subtitles out of the first SNIFF_SIZE characters
+    of their content, without parsing them.
+    Returns the formats the content looks like, the likeliest first, so an
+    empty list means we have no idea.
+    '''
+    head = _content_head(content)
+    scores = {}
+    for parser in set(ParserList.values()):
+        score = max([score for pattern, score in parser.CONTENT_PATTERNS
+                     if pattern.search(head)] or [0])
+        if score:
+            file_type = parser.file_type
+            if isinstance(file_type, list):
+                file_type = file_type[0]
+            scores[file_type] = score
+    return sorted(scores, key=lambda file_type: (-scores[file_type], file_type))
@@ -1,4 +1,8 @@
-from babelsubs.storage import SubtitleSet
+from io import BytesIO
+import re
+
+from lxml import etree
+from babelsubs.storage import SubtitleSet, LAZY_NORMALIZE_TIME, iter_ttml_cues
 from base import BaseTextParser, SubtitleParserError, register
 from xml.parsers.expat import ExpatError
 from lxml.etree import XMLSyntaxError
@@ -12,24 +16,75 @@ class DFXPParser(BaseTextParser):
     """
 
     file_type = ['dfxp', 'xml']
+    CONTENT_PATTERNS = (
+        (re.compile(r'<tt\b[^>]*\bxmlns\s*=\s*'
+                    r'["\']http://www\.w3\.org/ns/ttml["\']'), 100),
+        (re.compile(r'<tt[\s>]'), 60),
+    )
     NO_UNICODE = True
+    # file objects can be handed over directly, they get parsed with iterparse
+    ACCEPTS_STREAMS = True
+
+    def __init__(self, input_string, language=None, eager_parse=True):
+        if not eager_parse and hasattr(input_string, 'read'):
+            # the cues get parsed out of the document as they are asked
+            # for, which might happen more than once
+            input_string = input_string.read()
+        self.input_string = input_string
+        self.language = language
+        self._parse_or_check_header(eager_parse)
 
-    def __init__(self, input_string, language=None):
+    def _xml_stream(self):
+        if isinstance(self.input_string, unicode):
+            return BytesIO(self.input_string.encode('utf-8'))
+        return BytesIO(self.input_string)
+
+    def _check_header(self):
         try:
-            self.subtitle_set = SubtitleSet(language, input_string, normalize_time=True)
+            for event, root in etree.iterparse(self._xml_stream(),
+                                               events=('start',)):
+                break
         except (XMLSyntaxError, ExpatError), e:
             raise SubtitleParserError("There was an error while we were parsing your xml", e)
-
-        self.language = language
+        if root.tag.rsplit('}', 1)[-1] != 'tt':
+            raise SubtitleParserError("The root element should be 'tt'")
 
     def __len__(self):
-        return self.subtitle_set.__len__()
+        if hasattr(self, 'subtitle_set'):
+            return self.subtitle_set.__len__()
+        return super(DFXPParser, self).__len__()
 
     def __nonzero__(self):
-        return self.subtitle_set.__nonzero__()
+        if hasattr(self, 'subtitle_set'):
+            return self.subtitle_set.__nonzero__()
+        return super(DFXPParser, self).__nonzero__()
+
+    def _match_dicts(self):
+        if hasattr(self, 'subtitle_set'):
+            for item in self.subtitle_set.subtitle_items():
+                yield {'start': item.start_time, 'end': item.end_time,
+                       'text': item.text, 'region': item.region,
+                       'new_paragraph': item.new_paragraph}
+            return
+        try:
+            for cue in iter_ttml_cues(self._xml_stream()):
+                yield cue
+        except (XMLSyntaxError, ExpatError), e:
+            raise SubtitleParserError("There was an error while we were parsing your xml", e)
 
     def to_internal(self):
+        if not hasattr(self, 'subtitle_set'):
+            try:
+                if hasattr(self.input_string, 'read'):
+                    self.subtitle_set = SubtitleSet.from_stream(self.language,
+                        self.input_string, normalize_time=LAZY_NORMALIZE_TIME)
+                    # the stream has been used up
+                    self.input_string = None
+                else:
+                    self.subtitle_set = SubtitleSet(self.language,
+                        self.input_string, normalize_time=LAZY_NORMALIZE_TIME)
+            except (XMLSyntaxError, ExpatError), e:
+                raise SubtitleParserError("There was an error while we were parsing your xml", e)
         return self.subtitle_set
-        
 
 register(DFXPParser)
@@ -1,12 +1,47 @@
+from itertools import chain, islice
 import json
-from babelsubs.storage import SubtitleSet
+import re
 from babelsubs.parsers.base import (
     BaseTextParser, register, SubtitleParserError
 )
 
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+def iter_json_array(text):
+    """Iterate over the items of the JSON array in text.
+
+    Each item is decoded as it's asked for, so we never hold a list of all of
+    them.  Raises ValueError for invalid JSON, like json.loads() would
+    (possibly after yielding the items before the error).
+    """
+    position = _WHITESPACE_RE.match(text).end()
+    if text[position:position + 1] != '[':
+        raise ValueError("Expecting a JSON array")
+    position = _WHITESPACE_RE.match(text, position + 1).end()
+    if text[position:position + 1] != ']':
+        while True:
+            item, position = _decoder.raw_decode(text, position)
+            yield item
+            position = _WHITESPACE_RE.match(text, position).end()
+            separator = text[position:position + 1]
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ValueError("Expecting , or ] at %d" % position)
+            position = _WHITESPACE_RE.match(text, position + 1).end()
+    if _WHITESPACE_RE.match(text, position + 1).end() != len(text):
+        raise ValueError("Extra data after the JSON array")
+
+class _PositionsOutOfOrder(Exception):
+    pass
+
 
 class JSONParser(BaseTextParser):
     file_type = 'json'
+    CONTENT_PATTERNS = (
+        (re.compile(r'\A\s*\[\s*(\{|\]|\Z)'), 80),
+    )
 
     def __init__(self, input_string, pattern, language=None, flags=[], eager_parse=True):
         self.input_string = input_string
@@ -15,21 +50,94 @@ class JSONParser(BaseTextParser):
         super(JSONParser, self).__init__(input_string, pattern, language=language,
             flags=[], eager_parse=eager_parse)
 
-    def to_internal(self):
-        if not hasattr(self, 'sub_set'):
-            self.sub_set = SubtitleSet(self.language)
+    def _check_header(self):
+        if not self.input_string.lstrip().startswith('['):
+            raise SubtitleParserError("Invalid JSON data provided.")
+
+    # JSONGenerator numbers the cues 1, 2, 3... in order.  While the
+    # positions go like that no cue further on can come before the ones seen
+    # so far, so we hand them out as they get decoded.  From the first one
+    # that doesn't, the rest get buffered and sorted.
+    _sort_by_position = False
+
+    def _match_dicts(self):
+        try:
+            subs = iter_json_array(self.input_string)
+            if not self._sort_by_position:
+                index = 1
+                for sub in subs:
+                    if sub['position'] != index:
+                        subs = chain([sub], subs)
+                        break
+                    yield sub
+                    index += 1
+                rest = sorted(subs, key=lambda k: k['position'])
+                if rest and rest[0]['position'] < index:
+                    # a repeated position, it sorts among the cues we
+                    # already handed out
+                    raise _PositionsOutOfOrder()
+                for sub in rest:
+                    yield sub
+                return
+            for sub in sorted(subs, key=lambda k: k['position']):
+                yield sub
+        except ValueError:
+            raise SubtitleParserError("Invalid JSON data provided.")
 
+    def _sorting_if_needed(self, method, *args):
+        # call method, again with all the cues sorted if it finds the ones
+        # handed out so far aren't in order
+        try:
+            return method(self, *args)
+        except _PositionsOutOfOrder:
+            self._start_sorting()
+            return method(self, *args)
+
+    def _start_sorting(self):
+        self._sort_by_position = True
+        self._match_cache = self._match_source = None
+        if hasattr(self, 'sub_set'):
+            del self.sub_set
+
+    def __len__(self):
+        return self._sorting_if_needed(BaseTextParser.__len__)
+
+    def __nonzero__(self):
+        return self._sorting_if_needed(BaseTextParser.__nonzero__)
+
+    def __getitem__(self, key):
+        return self._sorting_if_needed(BaseTextParser.__getitem__, key)
+
+    def _result_iter(self):
+        handed_out = 0
+        try:
+            for cue in super(JSONParser, self)._result_iter():
+                yield cue
+                handed_out += 1
+        except _PositionsOutOfOrder:
+            # the cues handed out so far can't be taken back, go on with
+            # the others, sorted
+            self._start_sorting()
             try:
-                data = json.loads(self.input_string)
+                rest = sorted(islice(iter_json_array(self.input_string),
+                                     handed_out, None),
+                              key=lambda k: k['position'])
             except ValueError:
                 raise SubtitleParserError("Invalid JSON data provided.")
+            for sub in rest:
+                yield self._get_data(sub)
+
+    def _get_data(self, sub):
+        return {'start': sub['start'], 'end': sub['end'], 'text': sub['text']}
 
-            # Sort by the ``position`` key
-            data = sorted(data, key=lambda k: k['position'])
+    def to_internal(self):
+        return self._sorting_if_needed(JSONParser._to_internal)
 
-            for sub in data:
-                self.sub_set.append_subtitle(sub['start'], sub['end'],
-                    sub['text'])
+    def _to_internal(self):
+        if not hasattr(self, 'sub_set'):
+            self.sub_set = self.SUBTITLE_SET_CLASS(self.language)
+            self.sub_set.extend((sub['start'], sub['end'], sub['text'])
+                                for sub in self._iter_matches())
 
         return self.sub_set
 
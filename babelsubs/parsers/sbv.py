@@ -6,6 +6,12 @@ from babelsubs import utils
 class SBVParser(BaseTextParser):
 
     file_type = 'sbv'
+    CONTENT_PATTERNS = (
+        (re.compile(r'^\d:\d{2}:\d{2}\.\d{3},\d:\d{2}:\d{2}\.\d{3}$',
+                    re.M), 80),
+    )
+    # a blank line followed by a timing line
+    CHUNK_BOUNDARY_RE = re.compile(r'\n\n(?=\d:\d{2}:\d{2}\.\d{3},)')
 
     def __init__(self, input_string, language=None, eager_parse=True):
         pattern = r'(?P<s_hour>\d{1}):(?P<s_min>\d{2}):(?P<s_sec>\d{2})\.(?P<s_secfr>\d{3})'
@@ -1,25 +1,51 @@
 import re
 
-from lxml import etree
 from babelsubs import utils
-from babelsubs.parsers.base import BaseTextParser, register
+from babelsubs.parsers.base import (
+    BaseTextParser, register, iter_lines, iter_timed_cues
+)
+
+# a line with the start and end time of a cue, it must come right after the
+# line with the cue's number
+_TIMING_LINE_RE = re.compile(
+    r'(?P<s_hour>\d{2}):(?P<s_min>\d{2}):(?P<s_sec>\d{2})(,(?P<s_secfr>\d*))?'
+    r' --> '
+    r'(?P<e_hour>\d{2}):(?P<e_min>\d{2}):(?P<e_sec>\d{2})(,(?P<e_secfr>\d*))?$')
 
 class SRTParser(BaseTextParser):
 
     file_type = 'srt'
+    CONTENT_PATTERNS = (
+        (re.compile(r'^\d+[ \t]*\n\d{2}:\d{2}:\d{2}(,\d*)? --> \d{2}:',
+                    re.M), 90),
+        (re.compile(r'^\d{2}:\d{2}:\d{2},\d* --> ', re.M), 40),
+    )
+    # file objects are read a line at a time instead of all at once
+    ACCEPTS_STREAMS = True
+    # a blank line followed by a cue number
+    CHUNK_BOUNDARY_RE = re.compile(r'\n\n(?=[ \t]*\d+[ \t]*\n)')
+    input_stream = None
 
     def __init__(self, input_string, language_code, eager_parse=True):
-        pattern = r'\d+\s*?\n'
-        pattern += r'(?P<s_hour>\d{2}):(?P<s_min>\d{2}):(?P<s_sec>\d{2})(,(?P<s_secfr>\d*))?'
-        pattern += r' --> '
-        pattern += r'(?P<e_hour>\d{2}):(?P<e_min>\d{2}):(?P<e_sec>\d{2})(,(?P<e_secfr>\d*))?'
-        pattern += r'\n(\n|(?P<text>.+?)\n\n)'
-        # normalize line endings to \n and
-        # add line end for last sub
-        input_string = input_string.replace('\r\n', '\n').replace('\r', '\n')+'\n\n'
-        super(SRTParser, self).__init__(input_string, pattern, language=language_code,
-            flags=[re.DOTALL], eager_parse=eager_parse)
+        if hasattr(input_string, 'read'):
+            self.input_stream = input_string
+            input_string = u''
+        # normalize line endings to \n
+        input_string = input_string.replace('\r\n', '\n').replace('\r', '\n')
+        super(SRTParser, self).__init__(input_string, _TIMING_LINE_RE.pattern,
+            language=language_code, eager_parse=eager_parse)
+
+    def _reads_stream(self):
+        return self.input_stream is not None
 
+    def _match_dicts(self):
+        if self.input_stream is None:
+            lines = self._get_input_string().split('\n')
+        else:
+            # a stream can only be read once
+            stream, self.input_stream = self.input_stream, iter(())
+            lines = iter_lines(stream)
+        return iter_timed_cues(lines, _TIMING_LINE_RE.match, after_index=True)
 
     def _get_time(self, hour, min, sec, milliseconds):
         if milliseconds is None:
@@ -39,36 +65,12 @@ class SRTParser(BaseTextParser):
                                        match['e_min'],
                                        match['e_sec'],
                                        match['e_secfr'])
-        output['text'] = (
-            '' if match['text'] is None else
-            utils.escape_ampersands(utils.strip_tags(match['text']))
-        )
+        output['text'] = '' if match['text'] is None else match['text']
         return output
 
     def get_markup(self, text):
-        # create a simple element so we can parse using etree
-        # since srt uses html like tags as markup
-        base = "<p>%s</p>" % text
-        el = etree.fromstring(base)
-
-        content = [el.text]
-        base_span = '<span %s>%s</span>'
-
-        for child in el.getchildren():
-            tag = child.tag
-
-            if tag == 'b':
-                content.append(base_span % ('fontWeight="bold"', child.text))
-            elif tag == 'i':
-                content.append(base_span % ('fontStyle="italic"', child.text))
-            elif tag == 'u':
-                content.append(base_span % ('textDecoration="underline"', child.text))
-
-            content.append(child.tail)
-
-        if el.tail:
-            content.append(el.tail.strip())
-            
-        return "".join(filter(None, content)).replace("\n", "<br />")
+        # srt uses html like tags as markup, this also takes care of
+        # stripping the ones we don't support and of escaping the text
+        return utils.html_markup_to_ttml(text)
 
 register(SRTParser)
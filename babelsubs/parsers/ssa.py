@@ -1,16 +1,20 @@
 import re
 
-from babelsubs.parsers.srt import SRTParser
 from babelsubs.utils import (
     centiseconds_to_milliseconds, escape_ampersands,
     UNSYNCED_TIME_ONE_HOUR_DIGIT
 )
-from base import register
+from base import BaseTextParser, register
 
-class SSAParser(SRTParser):
+class SSAParser(BaseTextParser):
 
     file_type = ['ssa', 'ass']
     MAX_SUB_TIME = UNSYNCED_TIME_ONE_HOUR_DIGIT
+    CONTENT_PATTERNS = (
+        (re.compile(r'\A\s*\[Script Info\]', re.I), 100),
+        (re.compile(r'^Dialogue: ', re.M), 40),
+    )
+    CHUNK_BOUNDARY_RE = re.compile(r'\n(?=Dialogue: )')
 
     def __init__(self, input_string, language=None, eager_parse=True):
         pattern = r'Dialogue: [\w=]+,' #Dialogue: <Marked> or <Layer>,
@@ -24,7 +28,7 @@ class SSAParser(SRTParser):
         #replace \r\n to \n and fix end of last subtitle
         input_string = input_string.replace('\r\n', '\n')+'\n'
         self.markup_re = re.compile(r"{\\(?P<start>[biu])1}(?P<text>.+?){\\(?P<end>[biu])0}")
-        super(SRTParser, self).__init__(input_string, pattern, flags=[re.DOTALL],
+        super(SSAParser, self).__init__(input_string, pattern, flags=[re.DOTALL],
             language=language, eager_parse=eager_parse)
 
     def get_markup(self, text):
@@ -1,7 +1,6 @@
 import re
 from babelsubs import utils
 from base import BaseTextParser, register, SubtitleParserError
-from babelsubs.storage import SubtitleSet
 
 class TXTParser(BaseTextParser):
 
@@ -11,36 +10,37 @@ class TXTParser(BaseTextParser):
 
     def __init__(self, input_string, language=None, linebreak_re=_linebreak_re, eager_parse=True):
         self.language = language
-        self.input_string = linebreak_re.split(input_string)
-
-        if eager_parse:
-            self.to_internal()
-
-    def __len__(self):
-        return len(self.input_string)
-
-    def __nonzero__(self):
-        return bool(self.input_string)
-
-    def _result_iter(self):
-        for item in self.input_string:
-            output = {}
-            output['start'] = None
-            output['end'] = None
-            output['text'] = utils.strip_tags(item)
-            yield output
+        self.input_string = input_string
+        self.linebreak_re = linebreak_re
+        self._parse_or_check_header(eager_parse)
+
+    def _match_dicts(self):
+        # same as linebreak_re.split(), a paragraph at a time
+        position = 0
+        for match in self.linebreak_re.finditer(self.input_string):
+            yield self.input_string[position:match.start()]
+            position = match.end()
+        yield self.input_string[position:]
+
+    def _get_data(self, item):
+        output = {}
+        output['start'] = None
+        output['end'] = None
+        output['text'] = utils.strip_tags(item)
+        return output
 
     def to_internal(self):
 
         if not hasattr(self, 'sub_set'):
-            self.sub_set = SubtitleSet(self.language)
+            self.sub_set = self.SUBTITLE_SET_CLASS(self.language)
             valid = False
+            items = []
             for item in self._result_iter():
                 item['text'] = item['text'].replace("\n", '<br/>')
                 if not valid and ''.join(item['text'].split()):
                     valid = True
-                self.sub_set.append_subtitle(item['start'], item['end'],
-                                             item['text'], escape=False)
+                items.append((item['start'], item['end'], item['text']))
+            self.sub_set.extend(items, escape=False)
             if not valid:
                 raise SubtitleParserError("No subs")
         return self.sub_set
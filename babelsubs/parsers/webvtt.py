@@ -1,24 +1,33 @@
 import re
 
-from lxml import etree
 from babelsubs import utils
-from babelsubs.parsers.base import BaseTextParser, register
+from babelsubs.parsers.base import BaseTextParser, register, iter_timed_cues
+
+# the start and end time of a cue, plus its settings up to the end of the line
+_TIMING_LINE_RE = re.compile(
+    r'((?P<s_hour>\d{2}):)?(?P<s_min>\d{2}):(?P<s_sec>\d{2})(.(?P<s_secfr>\d*))?'
+    r' --> '
+    r'((?P<e_hour>\d{2}):)?(?P<e_min>\d{2}):(?P<e_sec>\d{2})(.(?P<e_secfr>\d*))?'
+    r'([ \t]+(?P<cue_settings>[^\r\n]+))?$')
 
 class WEBVTTParser(BaseTextParser):
 
     file_type = 'vtt'
+    CONTENT_PATTERNS = (
+        (re.compile(r'\AWEBVTT(?:[ \t]|$)', re.M), 100),
+        (re.compile(r'^(\d{2}:)?\d{2}:\d{2}\.\d* --> ', re.M), 40),
+    )
     _clean_pattern = re.compile(r'\{.*?\}', re.DOTALL)
+    CHUNK_BOUNDARY_RE = re.compile(r'\n\n(?=\S)')
 
     def __init__(self, input_string, language_code, eager_parse=True):
-        pattern = r'((?P<s_hour>\d{2}):)?(?P<s_min>\d{2}):(?P<s_sec>\d{2})(.(?P<s_secfr>\d*))?'
-        pattern += r' --> '
-        pattern += r'((?P<e_hour>\d{2}):)?(?P<e_min>\d{2}):(?P<e_sec>\d{2})(.(?P<e_secfr>\d*))?'
-        pattern += r'([ \t]+(?P<cue_settings>[^\r\n]+))?'
-        pattern += r'\n(\n|(?P<text>.+?)\n\n)'
-        input_string = input_string.replace('\r\n', '\n').replace('\r', '\n')+'\n\n'
-        super(WEBVTTParser, self).__init__(input_string, pattern, language=language_code,
-            flags=[re.DOTALL], eager_parse=eager_parse)
+        input_string = input_string.replace('\r\n', '\n').replace('\r', '\n')
+        super(WEBVTTParser, self).__init__(input_string, _TIMING_LINE_RE.pattern,
+            language=language_code, eager_parse=eager_parse)
 
+    def _match_dicts(self):
+        return iter_timed_cues(self._get_input_string().split('\n'),
+                               _TIMING_LINE_RE.search)
 
     def _get_time(self, hour, min, sec, milliseconds):
         if hour is None:
@@ -42,8 +51,7 @@ class WEBVTTParser(BaseTextParser):
                                        match['e_secfr'])
         output['text'] = (
             '' if match['text'] is None else
-            utils.escape_ampersands(utils.strip_tags(
-                self._clean_pattern.sub('', match['text'])))
+            self._clean_pattern.sub('', match['text'])
         )
         cue_settings = self._parse_cue_settings(match['cue_settings'])
         output['region'] = self.calc_region(cue_settings)
@@ -86,29 +94,8 @@ class WEBVTTParser(BaseTextParser):
             return None
 
     def get_markup(self, text):
-        # create a simple element so we can parse using etree
-        # webvtt uses html like tags as markup
-        base = "<p>%s</p>" % text
-        el = etree.fromstring(base)
-
-        content = [el.text]
-        base_span = '<span %s>%s</span>'
-
-        for child in el.getchildren():
-            tag = child.tag
-
-            if tag == 'b':
-                content.append(base_span % ('fontWeight="bold"', child.text))
-            elif tag == 'i':
-                content.append(base_span % ('fontStyle="italic"', child.text))
-            elif tag == 'u':
-                content.append(base_span % ('textDecoration="underline"', child.text))
-
-            content.append(child.tail)
-
-        if el.tail:
-            content.append(el.tail.strip())
-
-        return "".join(filter(None, content)).replace("\n", "<br />")
+        # webvtt uses html like tags as markup, this also takes care of
+        # stripping the ones we don't support and of escaping the text
+        return utils.html_markup_to_ttml(text)
 
 register(WEBVTTParser)
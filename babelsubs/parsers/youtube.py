@@ -1,59 +1,101 @@
+from io import BytesIO
+import re
+
 from lxml import etree
 from babelsubs.utils import unescape_html
 from babelsubs.parsers.base import BaseTextParser, register, SubtitleParserError
-from babelsubs.storage import SubtitleSet
 
 
 class YoutubeParser(BaseTextParser):
 
     file_type = 'youtube'
+    CONTENT_PATTERNS = (
+        (re.compile(r'\A\s*(<\?xml[^>]*>\s*)?<transcript[\s>]'), 100),
+    )
+    NO_UNICODE = True
+    # file objects can be handed over directly, they get parsed with iterparse
+    ACCEPTS_STREAMS = True
 
-    def __init__(self, input_string, language_code):
+    def __init__(self, input_string, language_code, eager_parse=True):
         self.language_code = language_code
         self._pattern = None
+        self._stream_input = False
 
+        if not eager_parse and hasattr(input_string, 'read'):
+            # the header gets checked before the cues are read
+            input_string = input_string.read()
+        self._stream_input = hasattr(input_string, 'read')
         self.input_string = input_string
         self.language = language_code
+        self._parse_or_check_header(eager_parse)
 
-    def __iter__(self):
-        if not hasattr(self, 'sub_set'):
-            self.to_internal()
+    def _reads_stream(self):
+        return self._stream_input
+
+    def _iterparse(self, events):
+        xml = self.input_string
+        if hasattr(xml, 'read'):
+            # a stream can only be read once
+            self.input_string = ''
+            return etree.iterparse(xml, events=events)
+        if isinstance(xml, unicode):
+            xml = xml.encode('utf-8')
+        return etree.iterparse(BytesIO(xml), events=events)
 
-        for sub in self.sub_set:
-            yield sub
+    def _check_header(self):
+        try:
+            for event, root in self._iterparse(('start',)):
+                break
+        except etree.XMLSyntaxError as e:
+            raise SubtitleParserError(original_error=e)
+        if root.tag != 'transcript':
+            raise SubtitleParserError("Not a youtube transcript")
+
+    def _match_dicts(self):
+        root = None
+        previous = None
+        for event, item in self._iterparse(('start', 'end')):
+            if root is None:
+                root = item
+            if event != 'end' or item.getparent() is not root:
+                continue
+            start = int(float(item.get('start')) * 1000)
+            if previous is not None:
+                # youtube sometimes omits the duration attribute
+                # in this case we're displaying until the next sub
+                # starts
+                previous['end'] = start
+                yield previous
+                previous = None
+            text = item.text and unescape_html(item.text) or u''
+            sub = {'start': start, 'end': None, 'text': text}
+            duration = item.get('dur')
+            if duration is not None:
+                sub['end'] = start + int(float(duration) * 1000)
+                yield sub
+            else:
+                previous = sub
+            # only the current sub is kept in memory
+            item.clear()
+            while item.getprevious() is not None:
+                del root[0]
+        if previous is not None:
+            # hardcode the last sub duration at 3 seconds
+            previous['end'] = previous['start'] + 3000
+            yield previous
 
     def to_internal(self):
         if not hasattr(self, 'sub_set'):
             try:
-                self.sub_set = SubtitleSet(self.language)
-                xml = etree.fromstring(self.input_string.encode('utf-8'))
-
-                has_subs = False
-                total_items = len(xml)
-                for i,item in enumerate(xml):
-                    duration = 0
-                    start = int(float(item.get('start')) * 1000)
-                    if hasattr(item, 'duration'):
-                        duration = int(float(item.get('dur', 0)) * 1000)
-                    elif i+1 < total_items:
-                        # youtube sometimes omits the duration attribute
-                        # in this case we're displaying until the next sub
-                        # starts
-                        next_item = xml[i+1]
-                        duration = int(float(next_item.get('start')) * 1000) - start
-                    else:
-                        # hardcode the last sub duration at 3 seconds
-                        duration = 3000
-                    end = start + duration
-                    text = item.text and unescape_html(item.text) or u''
-                    self.sub_set.append_subtitle(start, end, text)
-                    has_subs = True
-                if not has_subs:
+                self.sub_set = self.SUBTITLE_SET_CLASS(self.language)
+                items = [(item['start'], item['end'], item['text'])
+                         for item in self._iter_matches()]
+                if not items:
                     raise ValueError("No subs")
+                self.sub_set.extend(items)
             except Exception as e:
                 raise SubtitleParserError(original_error=e)
 
-
         return self.sub_set
 
 
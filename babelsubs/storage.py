@@ -16,16 +16,22 @@
 # You should have received a copy of the GNU Affero General Public License along
 # with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
 
+from array import array
+from bisect import bisect_left, bisect_right
 import copy
-import difflib
+import hashlib
 from itertools import izip_longest, izip
 import os
 import re
+import warnings
 from lxml import etree
 from xml.sax.saxutils import (escape as escape_xml,
-                              unescape as unescape_xml)
+                              unescape as unescape_xml,
+                              quoteattr)
 from collections import namedtuple
 
+from babelsubs import timing
+from babelsubs.diffing import SequenceDiff
 from babelsubs import utils
 from babelsubs.xmlconst import *
 
@@ -50,6 +56,9 @@ NAMESPACE_DECL = {
     'styling': TTS_NAMESPACE_URI,
 }
 VALID_ROOT_ELS = ('tt', 'body', 'div')
+# pass as normalize_time to only parse time expressions when they are read
+# (see SubtitleSet.__init__)
+LAZY_NORMALIZE_TIME = 'lazy'
 
 # The old, deprecated, API for SubtitleLine is a simple tuple.  We wrap that
 # tuple in a class to provide the new, nicer, API.
@@ -92,6 +101,118 @@ def _cleanup_legacy_namespace(input_string):
     input_string =  TTML_NAMESPACE_URI_LEGACY_NO_ANCHOR_RE.sub(r'"%s\3' % TTML_NAMESPACE_URI, input_string)
     return TTML_NAMESPACE_URI_LEGACY_RE.sub(r'"%s\3\4' % TTML_NAMESPACE_URI, input_string)
 
+class _LegacyNamespaceReader(object):
+    """File-like wrapper that runs _cleanup_legacy_namespace() as it reads.
+
+    The namespace attributes we replace never contain a '>', so we only clean
+    up to the last '>' of what we've read so far and keep the rest around
+    until the next read.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = ''
+
+    def read(self, size=-1):
+        while True:
+            data = self.stream.read(size)
+            if not data:
+                # end of the stream, what we kept around is safe to clean now
+                data, self.pending = self.pending + data, ''
+                return _cleanup_legacy_namespace(data)
+            data = self.pending + data
+            cut = data.rfind('>') + 1
+            self.pending = data[cut:]
+            if cut:
+                return _cleanup_legacy_namespace(data[:cut])
+
+def _collapse_whitespace(text):
+    # same cleanup SubtitleSet.__init__ does over the whole input string
+    if not text:
+        return text
+    return MULTIPLE_SPACES_RE.sub(" ", NEW_LINES_RE.sub("", text)) or None
+
+def _iterparse_ttml(stream):
+    """Parse TTML from a file-like object, returns the root element.
+
+    Whitespace is collapsed for each text node as soon as its element is
+    complete.  Tails are only known once the parent ends, so that's where we
+    clean them up.
+    """
+    context = etree.iterparse(_LegacyNamespaceReader(stream), events=('end',),
+                              remove_blank_text=True)
+    for event, el in context:
+        _clean_parsed_element(el)
+    return context.root
+
+def _clean_parsed_element(el):
+    el.text = _collapse_whitespace(el.text)
+    for child in el:
+        child.tail = _collapse_whitespace(child.tail)
+    for name, value in el.attrib.items():
+        cleaned = _collapse_whitespace(value) or ''
+        if cleaned != value:
+            el.set(name, cleaned)
+
+def _local_name(el):
+    tag = element_tag(el)
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, basestring) else tag
+
+def iter_ttml_cues(stream):
+    """Iterate over the subtitles of TTML in a file-like object.
+
+    Yields a dict for each subtitle, with the 'start' and 'end' times in
+    milliseconds (None for unsynced ones), its plain 'text' and 'region',
+    and whether it starts a 'new_paragraph'.  That's the same data
+    subtitle_items() gives for a SubtitleSet of the document, but the
+    document is parsed as the subtitles are asked for and only the
+    subtitle at hand is kept in memory.
+    """
+    context = etree.iterparse(_LegacyNamespaceReader(stream),
+                              events=('start', 'end'), remove_blank_text=True)
+    time_params = None
+    for event, el in context:
+        if event == 'start':
+            if time_params is None:
+                time_params = SubtitleSet._time_params_of(el)
+            elif (_local_name(el) == 'div' and
+                  'tick_rate' not in time_params):
+                # that's where SubtitleSet looks for the tick rate
+                time_params['tick_rate'] = int(el.get('tickRate', 1))
+            continue
+        _clean_parsed_element(el)
+        parent = el.getparent()
+        if (_local_name(el) != 'p' or parent is None or
+                _local_name(parent) != 'div' or
+                parent.getparent() is None or
+                _local_name(parent.getparent()) != 'body'):
+            continue
+        for br in el:
+            if _local_name(br) == 'br' and br.tail:
+                br.tail = br.tail.lstrip() or None
+        time_params.setdefault('tick_rate', 1)
+        begin, end, dur = [get_attr(el, name) or None
+                           for name in ('begin', 'end', 'dur')]
+        start = end_time = None
+        if begin:
+            start = time_expression_to_milliseconds(begin, **time_params)
+        if end:
+            end_time = time_expression_to_milliseconds(end, **time_params)
+        if dur:
+            end_time = ((start or 0) +
+                        time_expression_to_milliseconds(dur, **time_params))
+        yield {
+            'start': start,
+            'end': end_time,
+            'text': get_contents(el),
+            'region': get_attr(el, 'region'),
+            NEW_PARAGRAPH_META_KEY: el.getprevious() is None,
+        }
+        # keep the element around so the next one knows it's not the first
+        # of its div, but drop its content and whatever came before it
+        el.clear()
+        while el.getprevious() is not None:
+            del parent[0]
+
 def find_els(root_el, plain_xpath):
     """
     Since we might be using more than one namespace
@@ -132,47 +253,277 @@ def element_tag(el):
     else:
         return el.tag()
 
+def _distinct_mappings(mappings_list):
+    """
+    Split mappings_list into the distinct mappings and, for each entry of
+    mappings_list, the index of its equal in the distinct list.
+    """
+    distinct = []
+    slots = []
+    for mappings in mappings_list:
+        for i, seen in enumerate(distinct):
+            if seen == mappings:
+                slots.append(i)
+                break
+        else:
+            slots.append(len(distinct))
+            distinct.append(mappings)
+    return distinct, slots
+
+class _MarkupTemplates(object):
+    """The markup mappings for get_content_with_markup(), compiled.
+
+    Every combination of bold, italics and underline maps to the text that
+    goes before and after the contents of a span with that style, nested
+    the same way (bold outside, underline inside) as when the "%s"
+    templates get applied one after the other.
+    """
+    _CONTENT_MARKER = '\0'
+
+    def __init__(self, mappings):
+        self.mappings = dict(mappings)
+        self.quote_text = mappings.get('quote_text', lambda x: x)
+        self.linebreaks = mappings.get('linebreaks')
+        self.spans = {}
+        for bold in (False, True):
+            for italics in (False, True):
+                for underline in (False, True):
+                    template = "%s"
+                    if bold and 'bold' in mappings:
+                        template = template % mappings.get("bold", "")
+                    if italics and 'italics' in mappings:
+                        template = template % mappings.get("italics", "")
+                    if underline and 'underline' in mappings:
+                        template = template % mappings.get("underline", "")
+                    self.spans[bold, italics, underline] = tuple(
+                        (template % (self._CONTENT_MARKER,)).split(
+                            self._CONTENT_MARKER, 1))
+
+    def span_parts(self, span):
+        """Return the (before, after) markup for a span element."""
+        bold = italics = underline = False
+        for name, value in span.items():
+            # no i don't want to deal with namespaces right now sorry
+            name = name[name.rfind('}') + 1:]
+            if name == 'fontWeight':
+                bold = value == 'bold'
+            elif name == 'fontStyle':
+                italics = value == 'italic'
+            elif name == 'textDecoration':
+                underline = value == 'underline'
+        return self.spans[bold, italics, underline]
+
+_compiled_mappings = {}
+
+def _markup_templates(mappings):
+    """Return the _MarkupTemplates for mappings, compiling them only once.
+
+    They're keyed by the identity of mappings, generators always pass their
+    MAPPINGS class attribute.  A copy is kept to notice when the dict gets
+    changed or its id reused.
+    """
+    compiled = _compiled_mappings.get(id(mappings))
+    if compiled is None or compiled.mappings != mappings:
+        if len(_compiled_mappings) >= 32:
+            _compiled_mappings.clear()
+        compiled = _compiled_mappings[id(mappings)] = _MarkupTemplates(
+            mappings)
+    return compiled
+
+# events of the inline markup model used by _parse_inline_markup()
+_MARKUP_TEXT, _MARKUP_SPAN, _MARKUP_SPAN_END, _MARKUP_BR = range(4)
+
+_INLINE_MARKUP_SPLIT_RE = re.compile(r'(<[^<>]*>)')
+_INLINE_MARKUP_TAG_RE = re.compile(r"""
+    <(/)?(span|br)
+    ((?:\s+[A-Za-z_][\w.-]*\s*=\s*(?:"[^"<&]*"|'[^'<&]*'))*)
+    \s*(/)?>\Z
+""", re.VERBOSE)
+_INLINE_MARKUP_ATTR_RE = re.compile(
+    r"""([A-Za-z_][\w.-]*)\s*=\s*(?:"([^"<&]*)"|'([^'<&]*)')""")
+_XML_REFERENCE_RE = re.compile(
+    r'&(?:(amp|lt|gt|quot|apos)|#([0-9]+)|#x([0-9a-fA-F]+));')
+_BARE_AMPERSAND_RE = re.compile(
+    r'&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);)')
+_NON_XML_CHARS_RE = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff'
+                               u'\ufffe\uffff]')
+_XML_ENTITY_CHARS = {'amp': u'&', 'lt': u'<', 'gt': u'>', 'quot': u'"',
+                     'apos': u"'"}
+
+def _xml_char(codepoint):
+    if (codepoint in (0x9, 0xa, 0xd) or 0x20 <= codepoint <= 0xd7ff or
+            0xe000 <= codepoint <= 0xfffd or
+            0x10000 <= codepoint <= 0x10ffff):
+        return unichr(codepoint)
+    return None
+
+class _NotInlineMarkup(ValueError):
+    pass
+
+def _replace_xml_reference(match):
+    entity, dec, hex_code = match.groups()
+    if entity:
+        return _XML_ENTITY_CHARS[entity]
+    char = _xml_char(int(dec) if dec else int(hex_code, 16))
+    if char is None:
+        raise _NotInlineMarkup(match.group())
+    return char
+
+def _span_style(attrs):
+    """Return the (bold, italics, underline) style for the attributes of
+    a span, None if an attribute is repeated.
+    """
+    bold = italics = underline = False
+    names = set()
+    for name, value1, value2 in _INLINE_MARKUP_ATTR_RE.findall(attrs):
+        if name in names:
+            return None
+        names.add(name)
+        value = value1 or value2
+        if name == 'fontWeight':
+            bold = value == 'bold'
+        elif name == 'fontStyle':
+            italics = value == 'italic'
+        elif name == 'textDecoration':
+            underline = value == 'underline'
+    return (bold, italics, underline)
+
+_tag_events = {}
+
+def _inline_tag_events(tag):
+    """Return the markup events for a tag string like '<br/>', None if it's
+    not one of ours.
+    """
+    events = _tag_events.get(tag, False)
+    if events is not False:
+        return events
+    events = None
+    match = _INLINE_MARKUP_TAG_RE.match(tag)
+    if match is not None:
+        end, name, attrs, empty = match.groups()
+        style = _span_style(attrs)
+        if end:
+            if name == 'span' and not attrs and not empty:
+                events = ((_MARKUP_SPAN_END, None),)
+        elif style is None:
+            pass
+        elif name == 'br':
+            if empty:
+                events = ((_MARKUP_BR, None),)
+        elif empty:
+            events = ((_MARKUP_SPAN, style), (_MARKUP_SPAN_END, None))
+        else:
+            events = ((_MARKUP_SPAN, style),)
+    # subtitles only ever use a handful of different tags
+    if len(_tag_events) >= 256:
+        _tag_events.clear()
+    _tag_events[tag] = events
+    return events
+
+def _parse_inline_markup(markup):
+    """Parse the markup of a subtitle without building a <p> element.
+
+    Returns a list of (event, data) tuples: text, the start of a span (with
+    its (bold, italics, underline) style), the end of a span and line
+    breaks.  This covers the markup the text based parsers produce; for
+    anything else (other elements, comments, CDATA, carriage returns that
+    the XML parser would normalize, markup that isn't well formed...)
+    None is returned and the caller should let lxml deal with it.
+    """
+    if isinstance(markup, str):
+        try:
+            markup = markup.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+    if (u'\r' in markup or u']]>' in markup or
+            _NON_XML_CHARS_RE.search(markup)):
+        return None
+    if u'<' not in markup and u'&' not in markup:
+        # the common case: plain text
+        return [(_MARKUP_TEXT, markup)] if markup else []
+
+    events = []
+    open_spans = 0
+    parts = _INLINE_MARKUP_SPLIT_RE.split(markup)
+    # parts alternates between text and tags, starting with text
+    for i, part in enumerate(parts):
+        if i % 2:
+            tag_events = _inline_tag_events(part)
+            if tag_events is None:
+                return None
+            for event in tag_events:
+                if event[0] == _MARKUP_SPAN:
+                    open_spans += 1
+                elif event[0] == _MARKUP_SPAN_END:
+                    if not open_spans:
+                        return None
+                    open_spans -= 1
+            events.extend(tag_events)
+        elif part:
+            if u'<' in part:
+                return None
+            if u'&' in part:
+                if _BARE_AMPERSAND_RE.search(part):
+                    return None
+                try:
+                    part = _XML_REFERENCE_RE.sub(_replace_xml_reference, part)
+                except _NotInlineMarkup:
+                    return None
+            events.append((_MARKUP_TEXT, part))
+    if open_spans:
+        return None
+    return events
+
+def _render_inline_markup(events, mappings):
+    """Return what get_contents() or, with mappings,
+    get_content_with_markup() give for the <p> element of the markup
+    events.
+    """
+    if not mappings:
+        return u''.join([data for event, data in events
+                         if event == _MARKUP_TEXT]).strip()
+    compiled = _markup_templates(mappings)
+    quote_text = compiled.quote_text
+    linebreaks = compiled.linebreaks
+    text = []
+    closing = []
+    for event, data in events:
+        if event == _MARKUP_TEXT:
+            if data:
+                text.append(quote_text(data))
+        elif event == _MARKUP_SPAN:
+            before, after = compiled.spans[data]
+            text.append(before)
+            closing.append(after)
+        elif event == _MARKUP_SPAN_END:
+            text.append(closing.pop())
+        elif linebreaks is not None:
+            text.append(linebreaks)
+    return ''.join(text).strip()
+
 def get_contents(el):
     """Get the contents of the given element as a string of XML.
     """
     return "".join([x for x in el.itertext()]).strip()
 
-def time_expression_to_milliseconds(time_expression, tick_rate=None):
+def time_expression_to_milliseconds(time_expression, tick_rate=None,
+                                    frame_rate=None,
+                                    frame_rate_multiplier=None,
+                                    sub_frame_rate=None):
     """
     Parses possible values from time expressions[1] to a normalized value
     in milliseconds.
 
-    We don't support all possible forms now, only clock time, metric and tick.
+    Supports the whole grammar: clock time (with fractions or frames) and
+    offset time in hours, minutes, seconds, milliseconds, frames and ticks.
+    See babelsubs.timing for the details.
     [1] http://www.w3.org/TR/ttaf1-dfxp/#timing-value-timeExpression
     """
     if not time_expression:
         return 0
-    match = TIME_EXPRESSION_CLOCK_TIME.match(time_expression)
-    if match:
-        groups = match.groupdict()
-        hour = int(groups['hours'])
-        minutes = int(groups['minutes'])
-        seconds  = int(groups['seconds'])
-        milliseconds = int(groups['fraction'] or 0)
-        return (((hour * 3600) + (minutes * 60) + seconds ) * 1000 ) + milliseconds
-    match = TIME_EXPRESSION_METRIC.match(time_expression)
-    if match:
-        groups = match.groupdict()
-        num, unit = float(groups['num']), groups['unit']
-        if unit == 't':
-            if not tick_rate:
-                raise ValueError("Ticks need a tick rate, mate.")
-            return 1000 * (num / float(tick_rate))
-        multiplier = {
-            "h": 3600 * 1000,
-            "m": 60 * 1000,
-            "s": 1000,
-            "ms": 1,
-            'f': 0,
-        }.get(unit, None)
-        return num * multiplier
-    # Time expression can't be parsed
-    return None
+    return timing.parse_time_expression(time_expression, tick_rate,
+                                        frame_rate, frame_rate_multiplier,
+                                        sub_frame_rate)
 
 def milliseconds_to_time_clock_exp(milliseconds):
     """
@@ -181,32 +532,37 @@ def milliseconds_to_time_clock_exp(milliseconds):
     """
     if milliseconds is None:
         return None
-    expression = '%(hours)02d:%(minutes)02d:%(seconds)02d.%(milliseconds)03d'
-    return expression % utils.milliseconds_to_time_clock_components(milliseconds)
+    return timing.format_clock_time(milliseconds)
 
-def to_clock_time(time_expression, tick_rate=None):
+def to_clock_time(time_expression, tick_rate=None, frame_rate=None,
+                  frame_rate_multiplier=None, sub_frame_rate=None):
     """
     If time expression is not in clock time, transform it
     """
-    match = TIME_EXPRESSION_CLOCK_TIME.match(time_expression)
-    if match:
+    if timing.is_plain_clock_time(time_expression):
         return time_expression
-    return milliseconds_to_time_clock_exp(time_expression_to_milliseconds(time_expression, tick_rate))
+    return milliseconds_to_time_clock_exp(time_expression_to_milliseconds(
+        time_expression, tick_rate, frame_rate, frame_rate_multiplier,
+        sub_frame_rate))
 
 class _Differ(object):
     """Class that does the work for diff()."""
     def __init__(self, set_1, set_2, mappings):
         self.items1 = set_1.subtitle_items(mappings)
         self.items2 = set_2.subtitle_items(mappings)
-
-    def _subs_sequence(self, items):
-        return [(i.start_time, i.end_time, i.text) for i in items]
-
-    def _time_sequence(self, items):
-        return [(s.start_time, s.end_time) for s in items]
-
-    def _text_sequence(self, items):
-        return [(s.text,) for s in items]
+        self.subs1, self.times1, self.texts1 = self._sequences(self.items1)
+        self.subs2, self.times2, self.texts2 = self._sequences(self.items2)
+
+    def _sequences(self, items):
+        """Build the subs, time and text sequences in a single pass."""
+        subs = []
+        times = []
+        texts = []
+        for item in items:
+            subs.append((item.start_time, item.end_time, item.text))
+            times.append((item.start_time, item.end_time))
+            texts.append((item.text,))
+        return subs, times, texts
 
     def calc_diff(self):
         return {
@@ -217,23 +573,17 @@ class _Differ(object):
         }
 
     def calc_time_changed(self):
-        sm = difflib.SequenceMatcher(None, self._time_sequence(self.items1),
-                                     self._time_sequence(self.items2))
-        return 1.0 - sm.ratio()
+        return 1.0 - SequenceDiff(self.times1, self.times2).ratio()
 
     def calc_text_changed(self):
-        sm = difflib.SequenceMatcher(None, self._text_sequence(self.items1),
-                                     self._text_sequence(self.items2))
-        return 1.0 - sm.ratio()
+        return 1.0 - SequenceDiff(self.texts1, self.texts2).ratio()
 
     def calc_subtitle_data(self):
         # when calculating the diff, we only match against the times/text and
         # ignore the meta.
-        sm = difflib.SequenceMatcher(None,
-                                     self._subs_sequence(self.items1),
-                                     self._subs_sequence(self.items2))
         rv = []
-        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        opcodes = SequenceDiff(self.subs1, self.subs2).get_opcodes()
+        for tag, i1, i2, j1, j2 in opcodes:
             if tag == 'equal':
                 for i, j in izip(xrange(i1, i2), xrange(j1, j2)):
                     rv.append(self.make_subtitle_data_item(i, j))
@@ -300,6 +650,77 @@ def calc_changes(set_1, set_2, mappings=None):
     differ = _Differ(set_1, set_2, mappings)
     return differ.calc_text_changed(), differ.calc_time_changed()
 
+# fingerprints are sums of the cue hashes weighted by position, modulo this
+# (Mersenne) prime
+_FINGERPRINT_MODULUS = 2 ** 127 - 1
+
+def _fingerprint_field(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float) and value == int(value):
+        # 1500.0 and 1500 are the same time
+        value = int(value)
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = repr(value)
+    return '+' + value
+
+def _cue_hash(item):
+    """Hash the parts of a SubtitleLine that __eq__ cares about."""
+    data = '\x00'.join(_fingerprint_field(value) for value in (
+        item.start_time, item.end_time, item.text, item.region,
+        item.new_paragraph))
+    return int(hashlib.md5(data).hexdigest(), 16) % _FINGERPRINT_MODULUS
+
+class _CueIntervalIndex(object):
+    """Index of the synced subtitles of a SubtitleSet by time.
+
+    The subtitles are kept sorted by start time, next to a running maximum of
+    their end times.  To find the ones overlapping a window we bisect for the
+    last subtitle starting before the window ends and walk back until the
+    running maximum says nothing earlier reaches into the window, so a query
+    only looks at the subtitles near it.
+
+    Subtitles without a start time aren't indexed.  A missing end time means
+    the subtitle lasts forever.
+    """
+    def __init__(self, items):
+        synced = sorted((item.start_time, i) for i, item in enumerate(items)
+                        if item.start_time is not None)
+        self.items = items
+        self.starts = []
+        self.max_ends = []
+        self.indexes = []
+        max_end = None
+        for start, i in synced:
+            end = items[i].end_time
+            if end is None:
+                end = float('inf')
+            max_end = end if max_end is None else max(max_end, end)
+            self.starts.append(start)
+            self.max_ends.append(max_end)
+            self.indexes.append(i)
+
+    def overlapping(self, count, after):
+        """Return the items among the first count by start time that end
+        after after.
+        """
+        found = []
+        i = count - 1
+        while i >= 0 and self.max_ends[i] > after:
+            item = self.items[self.indexes[i]]
+            if item.end_time is None or item.end_time > after:
+                found.append(self.indexes[i])
+            i -= 1
+        return [self.items[j] for j in sorted(found)]
+
+    def at(self, ms):
+        return self.overlapping(bisect_right(self.starts, ms), ms)
+
+    def between(self, from_ms, to_ms):
+        return self.overlapping(bisect_left(self.starts, to_ms), from_ms)
+
 class SubtitleSet(object):
     BASE_TTML = '''\
 <tt xml:lang="%(language_code)s" xmlns="%(namespace_uri)s" xmlns:tts="http://www.w3.org/ns/ttml#styling">
@@ -342,6 +763,11 @@ class SubtitleSet(object):
 
         language_code: The bcp47 code for this language.
         initial_data: any optional xml as the starting point.
+        normalize_time: rewrite begin/dur/end attributes of initial_data to
+        begin/end clock times.  With LAZY_NORMALIZE_TIME the time expressions
+        are only parsed when a subtitle's timing is first read and the
+        attributes are rewritten when the tree gets serialized (to_xml(),
+        as_etree_node()) or the elements are handed out (get_subtitles()).
         NO UNICODE ALLOWED!  USE XML ENTITIES TO REPRESENT UNICODE CHARACTERS!
 
         """
@@ -354,16 +780,9 @@ class SubtitleSet(object):
             initial_data = NEW_LINES_RE.sub("", initial_data)
             initial_data = MULTIPLE_SPACES_RE.sub(" ", initial_data)
 
-            self._set_ttml(etree.fromstring(initial_data,
-                parser=etree.XMLParser(remove_blank_text=True)))
-            # now, if there's a space after a <br> tag, we don't want it here.
-            # most likely it was created by indenting. But *only* it it's after a
-            # <br> tag, so we must loop through them
-            for node in find_els(self._ttml, "/tt/body/div/*/br"):
-                node.tail = node.tail.lstrip() if node.tail else None
-            self.tick_rate = self._get_tick_rate()
-            if normalize_time:
-                [self.normalize_time(x) for x in self.get_subtitles()]
+            self._load_ttml(etree.fromstring(initial_data,
+                parser=etree.XMLParser(remove_blank_text=True)),
+                normalize_time)
         else:
             self._set_ttml(etree.fromstring(SubtitleSet.BASE_TTML % {
                 'namespace_uri': TTML_NAMESPACE_URI,
@@ -372,10 +791,33 @@ class SubtitleSet(object):
                 'language_code': language_code or '',
             }))
 
-        if initial_data:
-            self.subtitles = self.subtitle_items()
-        else:
-            self.subtitles = None
+    @classmethod
+    def from_stream(cls, language_code, stream, normalize_time=True):
+        """Create a new set of Subtitles from a file-like object with TTML.
+
+        This does the same cleanup as passing initial_data to the
+        constructor, but the document is parsed incrementally with iterparse
+        and the legacy namespace / whitespace cleanup is done chunk by chunk
+        and node by node, so we never hold more than the tree itself (instead
+        of several copies of the whole document) in memory.
+        """
+        self = cls.__new__(cls)
+        self._load_ttml(_iterparse_ttml(stream), normalize_time)
+        return self
+
+    def _load_ttml(self, ttml, normalize_time):
+        self._set_ttml(ttml)
+        # now, if there's a space after a <br> tag, we don't want it here.
+        # most likely it was created by indenting. But *only* it it's after a
+        # <br> tag, so we must loop through them
+        for node in find_els(self._ttml, "/tt/body/div/*/br"):
+            node.tail = node.tail.lstrip() if node.tail else None
+        self.tick_rate = self._time_params.setdefault('tick_rate',
+                                                      self._get_tick_rate())
+        if normalize_time == LAZY_NORMALIZE_TIME:
+            self._times_pending = True
+        elif normalize_time:
+            [self.normalize_time(x) for x in self.get_subtitles()]
 
     @classmethod
     def create_with_raw_ttml(cls, ttml):
@@ -389,32 +831,80 @@ class SubtitleSet(object):
         utils.indent_ttml(ttml)
         self._ttml = ttml
         self._body = find_els(self._ttml, '/tt/body')[-1]
+        self._time_params = self._read_time_params()
+        self._times_pending = False
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Forget the cached index of div and p elements.
+
+        append_subtitle() and update() keep the index current by themselves,
+        this only needs to be called after changing the tree in some other
+        way (e.g. by moving elements around in _ttml directly).
+        """
+        self._divs = None
+        self._subtitle_els = None
+        self._forget_subtitle_data()
+
+    def _forget_subtitle_data(self):
+        # everything derived from the contents of the p elements
+        self._times = {}
+        self._cue_hashes = None
+        self._fingerprint = None
+        self._interval_index = None
+        self._items_cache = {}
+        self._items_version = getattr(self, '_items_version', 0) + 1
+
+    def _build_index(self):
+        self._divs = find_els(self._body, "div")
+        self._subtitle_els = []
+        for div in self._divs:
+            self._subtitle_els.extend(find_els(div, 'p'))
+
+    def _get_divs(self):
+        if self._divs is None:
+            self._build_index()
+        return self._divs
+
+    def _get_subtitle_els(self):
+        if self._subtitle_els is None:
+            self._build_index()
+        return self._subtitle_els
 
     def __len__(self):
-        return len(self.get_subtitles())
+        return len(self._get_subtitle_els())
 
     def __getitem__(self, key):
-        if self.subtitles is None:
-            self.subtitles = self.subtitle_items()
-        return self.subtitles[key]
+        return self._cached_items(None)[key]
+
+    @property
+    def subtitles(self):
+        """The cached subtitle_items() list, deprecated.
+
+        Use subtitle_items() or index the set instead.
+        """
+        warnings.warn("SubtitleSet.subtitles is deprecated, use "
+                      "subtitle_items()", DeprecationWarning, stacklevel=2)
+        return self._cached_items(None)
 
     def find_divs(self):
-        return find_els(self._body, "div")
+        return list(self._get_divs())
 
     def last_div(self):
-        return self.find_divs()[-1]
+        return self._get_divs()[-1]
 
     def get_subtitles(self):
-        result = []
-
-        for div in self.find_divs():
-            el_count = 0
+        """Return the p elements of the subtitles.
 
-            for el in find_els(div, 'p'):
-                el_count += 1
-                result.append(el)
-
-        return result
+        These are the elements of the tree, not copies, so the cached
+        subtitle data (subtitle_items(), fingerprint(), cues_at()) is dropped
+        and gets rebuilt from whatever the caller changes in them.  Changes
+        made after the set has been read again need invalidate_cache().
+        """
+        self._normalize_pending_times()
+        els = list(self._get_subtitle_els())
+        self._forget_subtitle_data()
+        return els
 
     def append_subtitle(self, from_ms, to_ms, content, new_paragraph=False,
                         region=None, escape=True):
@@ -430,13 +920,81 @@ class SubtitleSet(object):
         p = self._create_subtitle_p(from_ms, to_ms, content)
         if region:
             p.set('region', region)
+        self._append_p(p, new_paragraph)
+
+    def extend(self, subtitles, escape=True):
+        """Append many subtitles to the end of the list at once.
+
+        subtitles is an iterable of (from_ms, to_ms, content) or
+        (from_ms, to_ms, content, meta) tuples, where meta is a dict that may
+        hold the new_paragraph and region keys (see append_subtitle).
 
-        if new_paragraph and len(self.last_div()) > 0:
+        All the <p> elements are parsed with a single etree.fromstring() call
+        instead of one per subtitle, which makes this a lot faster than
+        calling append_subtitle() in a loop.
+        """
+        fragments = []
+        paragraphs = []
+        for s in subtitles:
+            from_ms, to_ms, content = s[:3]
+            meta = s[3] if len(s) > 3 and s[3] else {}
+            if escape:
+                content = escape_xml(content)
+            content = self._fix_xml_content(content)
+            if not isinstance(content, unicode):
+                content = content.decode('utf-8')
+            fragments.append(self._p_fragment(from_ms, to_ms, content,
+                                              meta.get(REGION_META_KEY)))
+            paragraphs.append(bool(meta.get(NEW_PARAGRAPH_META_KEY)))
+        if not fragments:
+            return
+
+        try:
+            batch = etree.fromstring(u'<div xmlns="%s">%s</div>' % (
+                TTML_NAMESPACE_URI, u''.join(fragments)))
+        except etree.XMLSyntaxError:
+            batch = None
+        if batch is None or len(batch) != len(fragments):
+            # some content isn't well formed on its own (or it closes the <p>
+            # tag), go the slow way so we fail on the right subtitle
+            for fragment, new_paragraph in zip(fragments, paragraphs):
+                self._append_p(etree.fromstring(fragment), new_paragraph)
+            return
+
+        for p, new_paragraph in zip(list(batch), paragraphs):
+            self._append_p(p, new_paragraph)
+
+    # templates used by extend() to build the markup for a <p> element
+    _p_template = u'<p xmlns="%s"%%s>%%s</p>' % TTML_NAMESPACE_URI
+    _begin_attr_template = u' begin="%s"'
+    _end_attr_template = u' end="%s"'
+    _region_attr_template = u' region=%s'
+
+    def _p_fragment(self, from_ms, to_ms, content, region):
+        attrs = []
+        if from_ms is not None:
+            attrs.append(self._begin_attr_template %
+                         milliseconds_to_time_clock_exp(from_ms))
+        if to_ms is not None:
+            attrs.append(self._end_attr_template %
+                         milliseconds_to_time_clock_exp(to_ms))
+        if region:
+            attrs.append(self._region_attr_template % quoteattr(region))
+        return self._p_template % (u''.join(attrs), content)
+
+    def _append_p(self, p, new_paragraph):
+        self._fix_span_attributes(p)
+        # len() on an lxml element counts the children one by one, only
+        # check if there is a first one
+        if new_paragraph and next(iter(self.last_div()), None) is not None:
             div = etree.SubElement(self._body, TTML + 'div')
+            self._get_divs().append(div)
         else:
             div = self.last_div()
         div.append(p)
+        self._get_subtitle_els().append(p)
         self._adjust_whitespace_after_append(div, p, new_paragraph)
+        self._subtitle_appended()
 
     # couple of constants to easily create the text/tail attributes for the
     # elements we create inside the body
@@ -445,15 +1003,17 @@ class SubtitleSet(object):
     _whitespace_after_last_div = "\n" + " " * 4
 
     def _adjust_whitespace_after_append(self, div, p, new_paragraph):
-        if len(div) == 1:
+        previous = p.getprevious()
+        if previous is None:
             # first element added
             div.text = self._whitespace_before_p_tag
         else:
-            div[-2].tail = self._whitespace_before_p_tag
+            previous.tail = self._whitespace_before_p_tag
         p.tail = self._whitespace_before_div_tag
         if new_paragraph:
-            if len(self._body) > 1:
-                self._body[-2].tail = self._whitespace_before_div_tag
+            previous_div = div.getprevious()
+            if previous_div is not None:
+                previous_div.tail = self._whitespace_before_div_tag
             div.tail = self._whitespace_after_last_div
 
     def _create_subtitle_p(self, from_ms, to_ms, content):
@@ -464,7 +1024,9 @@ class SubtitleSet(object):
             p.set('begin', milliseconds_to_time_clock_exp(from_ms))
         if to_ms is not None:
             p.set('end', milliseconds_to_time_clock_exp(to_ms))
+        return p
 
+    def _fix_span_attributes(self, p):
         # fromstring has no sane way to set an attribute namespace (yay)
         # so we delete the old attrib, and add the new one with the prefixed
         # namespace
@@ -474,7 +1036,6 @@ class SubtitleSet(object):
                 if attr_name in ('fontStyle', 'textDecoration', 'fontWeight'):
                     span.set(TTS + attr_name, value)
                     del span.attrib[attr_name]
-        return p
 
     _invalid_xml_control_chars_ascii = ''.join(chr(i) for i in xrange(32)
                                          if chr(i) not in "\n\r\t")
@@ -497,22 +1058,55 @@ class SubtitleSet(object):
 
         Changes node in place
         """
+        begin, end, dur = self._normalized_time_attrs(el)
+        if dur:
+            el.attrib.pop('dur')
+        if begin:
+            el.attrib['begin'] = begin
+        if end:
+            el.attrib['end'] = end
+
+    def _normalized_time_attrs(self, el):
+        """Return the (begin, end, dur) normalize_time() would leave on el.
+        """
         begin = get_attr(el, 'begin')
         if begin:
-            begin = to_clock_time(begin, self.tick_rate)
+            begin = to_clock_time(begin, **self._time_params)
         end = get_attr(el, 'end')
         if end:
-            end = to_clock_time(end, self.tick_rate)
+            end = to_clock_time(end, **self._time_params)
         dur = get_attr(el, 'dur')
         if dur:
             end= milliseconds_to_time_clock_exp(
-                time_expression_to_milliseconds(begin, self.tick_rate) + \
-                time_expression_to_milliseconds(dur, self.tick_rate))
-            el.attrib.pop('dur')
-        if begin:
-            el.attrib['begin'] = begin
-        if end:
-            el.attrib['end'] = end
+                time_expression_to_milliseconds(begin, **self._time_params) + \
+                time_expression_to_milliseconds(dur, **self._time_params))
+        return begin, end, dur
+
+    def _normalize_pending_times(self):
+        """Write out the normalized times of a lazily normalized set."""
+        if self._times_pending:
+            self._times_pending = False
+            for el in self._get_subtitle_els():
+                self.normalize_time(el)
+            self._times = {}
+
+    def _get_times(self, el):
+        """Return the (from_ms, to_ms) of a subtitle element."""
+        if not self._times_pending:
+            return (self._time_attr_to_ms(get_attr(el, 'begin')),
+                    self._time_attr_to_ms(get_attr(el, 'end')))
+        try:
+            return self._times[el]
+        except KeyError:
+            begin, end, dur = self._normalized_time_attrs(el)
+            times = (self._time_attr_to_ms(begin), self._time_attr_to_ms(end))
+            self._times[el] = times
+            return times
+
+    def _time_attr_to_ms(self, value):
+        if value is None or value == '':
+            return None
+        return time_expression_to_milliseconds(value, **self._time_params)
 
     def subtitle_items(self, mappings=None):
         """
@@ -523,48 +1117,116 @@ class SubtitleSet(object):
 
         Meta is a dict with additional information.
         """
-        result = []
+        return list(self._cached_items(mappings))
 
-        for el in self.get_subtitles():
-            # bool(el.getprevious()) doesn't do what you'd think
-            # use 'is None'
-            meta = {
-                NEW_PARAGRAPH_META_KEY: (el.getprevious() is None),
-                REGION_META_KEY: get_attr(el, 'region'),
-            }
-            result.append(self._extract_from_el(el, meta, mappings))
+    def iter_subtitle_items(self, mappings=None):
+        """
+        Like subtitle_items(), but yields the items one at a time.
 
-        self.subtitles = result
-        return result
+        Unless they're cached already the items are built as they're
+        needed, so a generator can write each cue out as soon as it's ready.
+        """
+        return (items[0] for items in self.iter_subtitle_items_for([mappings]))
 
-    def _extract_from_el(self, el, meta, mappings):
-        begin = get_attr(el, 'begin')
-        end = get_attr(el, 'end')
+    def iter_subtitle_items_for(self, mappings_list):
+        """
+        Yield, for every subtitle, a sequence with its subtitle_items() entry
+        for each of mappings_list.
 
+        The subtitles are walked only once: times and meta are read once per
+        subtitle and the text is extracted once per distinct mappings.
+        """
+        entries = [self._items_cache.get(id(mappings))
+                   for mappings in mappings_list]
+        if entries and None not in entries:
+            return izip(*[items for mappings, items in entries])
+        return self._iter_caching_items(mappings_list)
 
-        from_ms = (time_expression_to_milliseconds(begin)
-                if begin  is not None and begin is not '' else None)
-        to_ms = (time_expression_to_milliseconds(end)
-                if end is not None and end is not '' else None)
-        if not mappings:
-            content = get_contents(el)
-        else:
-            content = self.get_content_with_markup(el, mappings)
+    # how many mappings subtitle_items() remembers the items for
+    ITEMS_CACHE_SIZE = 8
+
+    def _cached_items(self, mappings):
+        """
+        Return the subtitle_items() list for mappings, building it the
+        first time.
 
+        The lists are keyed by the identity of mappings; generators always
+        pass their MAPPINGS class attribute.  append_subtitle(), extend()
+        and update() keep them current, retiming drops them.
+        """
+        entry = self._items_cache.get(id(mappings))
+        if entry is not None:
+            return entry[1]
+        items = [item for item, in self._iter_items_for([mappings])]
+        self._cache_items(mappings, items)
+        return items
+
+    def _cache_items(self, mappings, items):
+        if len(self._items_cache) >= self.ITEMS_CACHE_SIZE:
+            self._items_cache.clear()
+        # keep mappings alive so its id can't be reused
+        self._items_cache[id(mappings)] = (mappings, items)
+
+    def _iter_caching_items(self, mappings_list):
+        version = self._items_version
+        columns = [[] for mappings in mappings_list]
+        for items in self._iter_items_for(mappings_list):
+            for column, item in izip(columns, items):
+                column.append(item)
+            yield items
+        # only a complete walk of unchanged subtitles gets cached
+        if version == self._items_version:
+            for mappings, column in izip(mappings_list, columns):
+                self._cache_items(mappings, column)
+
+    def _iter_items_for(self, mappings_list):
+        distinct, slots = _distinct_mappings(mappings_list)
+        for el in self._get_subtitle_els():
+            from_ms, to_ms = self._get_times(el)
+            new_paragraph = el.getprevious() is None
+            region = get_attr(el, 'region')
+            items = [SubtitleLine(from_ms, to_ms,
+                                  self._content_for_el(el, mappings),
+                                  {NEW_PARAGRAPH_META_KEY: new_paragraph,
+                                   REGION_META_KEY: region})
+                     for mappings in distinct]
+            yield [items[slot] for slot in slots]
+
+    def _item_for_el(self, el, mappings):
+        # bool(el.getprevious()) doesn't do what you'd think
+        # use 'is None'
+        meta = {
+            NEW_PARAGRAPH_META_KEY: (el.getprevious() is None),
+            REGION_META_KEY: get_attr(el, 'region'),
+        }
+        return self._extract_from_el(el, meta, mappings)
+
+    def _subtitle_item(self, index, mappings=None):
+        """Return the subtitle_items() entry for a single subtitle."""
+        return self._item_for_el(self._get_subtitle_els()[index], mappings)
+
+    def _extract_from_el(self, el, meta, mappings):
+        from_ms, to_ms = self._get_times(el)
+        content = self._content_for_el(el, mappings)
         return SubtitleLine(from_ms, to_ms, content, meta)
 
-    def __clear_namespace(self, name):
-        return name.split("}")[-1] if '}' in name else name
+    def _content_for_el(self, el, mappings):
+        if not mappings:
+            return get_contents(el)
+        return self.get_content_with_markup(el, mappings)
 
     def item_is_synced(self, el):
         begin = el.attrib.get('begin', None)
         end = el.attrib.get('end', None)
+        if self._times_pending and not (end and end.strip()):
+            # normalizing will turn a dur into an end time
+            end = el.attrib.get('dur', None)
         return begin is not None and begin.strip() != '' and \
                end is not None and end.strip() != ''
 
     @property
     def fully_synced(self):
-        for item in self.get_subtitles():
+        for item in self._get_subtitle_els():
             if not self.item_is_synced(item):
                 return False
         return True
@@ -573,48 +1235,47 @@ class SubtitleSet(object):
         return self._get_content_with_markup(el, mappings).strip()
 
     def _get_content_with_markup(self, el, mappings):
-        quote_text = mappings.get('quote_text', lambda x: x)
+        compiled = _markup_templates(mappings)
+        quote_text = compiled.quote_text
+        linebreaks = compiled.linebreaks
         text = []
         if el.text:
             text.append(quote_text(el.text))
-        for child in el:
-            tag = self.__clear_namespace(element_tag(child))
-
-            if tag == 'span':
-                template = self._template_for_span(child, mappings)
-                text.append(template %
-                            (self._get_content_with_markup(child, mappings),))
-
-            elif tag == "br":
-                if 'linebreaks' in mappings:
-                    text.append(mappings['linebreaks'])
-
-            if child.tail:
-                text.append(quote_text(child.tail))
+        # walk the spans depth first without recursing: each level holds the
+        # iterator over its children and what to write once they're done
+        stack = [(iter(el), None, None)]
+        while stack:
+            children, after, tail = stack[-1]
+            for child in children:
+                tag = child.tag
+                if not isinstance(tag, basestring):
+                    # comments and processing instructions
+                    tag = ''
+                tag = tag[tag.rfind('}') + 1:]
+
+                if tag == 'span':
+                    before, span_after = compiled.span_parts(child)
+                    text.append(before)
+                    if child.text:
+                        text.append(quote_text(child.text))
+                    stack.append((iter(child), span_after, child.tail))
+                    break
+
+                elif tag == "br":
+                    if linebreaks is not None:
+                        text.append(linebreaks)
+
+                if child.tail:
+                    text.append(quote_text(child.tail))
+            else:
+                stack.pop()
+                if after is not None:
+                    text.append(after)
+                    if tail:
+                        text.append(quote_text(tail))
 
         return ''.join(text)
 
-    def _template_for_span(self, elt, mappings):
-        """String to use for a span for get_content_with_markup().
-
-        The returned string will contain a single "%s" value to be filled in
-        with the contents of the span.
-        """
-        # no i don't want to deal with namespaces right now sorry
-        attrs = dict([(self.__clear_namespace(n), v)
-                      for n, v in elt.items()])
-
-        template = "%s"
-        if attrs.get('fontWeight', '') == 'bold' and 'bold' in mappings:
-            template = template % mappings.get("bold", "")
-
-        if attrs.get('fontStyle', '') == 'italic' and 'italics' in mappings:
-            template = template % mappings.get("italics", "")
-
-        if attrs.get('textDecoration', '') == 'underline' and 'underline' in mappings:
-            template = template % mappings.get("underline", "")
-        return template
-
     def update(self, subtitle_index, from_ms=None, to_ms=None):
         """Updates the subtitle on index subtitle_index with the
         new timing data. (in place)
@@ -623,11 +1284,146 @@ class SubtitleSet(object):
         utils.UNSYNCED_TIME_FULL  as the value to pass
         TODO: Implement content change (beware of escaping
         """
-        el = self.get_subtitles()[subtitle_index]
+        el = self._get_subtitle_els()[subtitle_index]
+        if self._times_pending:
+            self.normalize_time(el)
+            self._times.pop(el, None)
         if from_ms is not None:
             el.set('begin',   milliseconds_to_time_clock_exp(from_ms) )
         if to_ms is not None:
             el.set('end',  milliseconds_to_time_clock_exp(to_ms) )
+        self._subtitle_updated(subtitle_index)
+
+    def retime(self, mapping):
+        """Change the timing of all subtitles in one pass.
+
+        mapping is called with each start and end time (in milliseconds) and
+        returns the new one.  Missing times are left alone, so unsynced
+        subtitles stay unsynced.  New times are rounded to whole milliseconds
+        and never go below 0.
+        """
+        def retime_ms(milliseconds):
+            return max(0, int(round(mapping(milliseconds))))
+        self._retime(retime_ms)
+        self._subtitles_retimed()
+
+    def _retime(self, retime_ms):
+        self._normalize_pending_times()
+        for el in self._get_subtitle_els():
+            from_ms, to_ms = self._get_times(el)
+            if from_ms is not None:
+                el.set('begin', milliseconds_to_time_clock_exp(
+                    retime_ms(from_ms)))
+            if to_ms is not None:
+                el.set('end', milliseconds_to_time_clock_exp(retime_ms(to_ms)))
+
+    def shift(self, offset_ms):
+        """Move all subtitles offset_ms later (earlier if negative)."""
+        self.retime(lambda milliseconds: milliseconds + offset_ms)
+
+    def scale(self, factor, origin_ms=0):
+        """Stretch the timing by factor around origin_ms."""
+        self.retime(lambda milliseconds:
+                    origin_ms + (milliseconds - origin_ms) * factor)
+
+    def convert_frame_rate(self, from_rate, to_rate):
+        """Retime subtitles for a video played at to_rate instead of
+        from_rate frames per second (e.g. 23.976 -> 25).
+        """
+        self.scale(float(from_rate) / to_rate)
+
+    def retime_piecewise(self, points):
+        """Retime subtitles through a list of (old_ms, new_ms) sync points.
+
+        See timing.piecewise_linear() for how times between and around the
+        points get mapped.
+        """
+        self.retime(timing.piecewise_linear(points))
+
+    def _subtitles_retimed(self):
+        """Drop the derived data after all subtitles got retimed."""
+        self._cue_hashes = None
+        self._fingerprint = None
+        self._interval_index = None
+        self._items_cache = {}
+        self._items_version += 1
+
+    def _subtitle_appended(self):
+        """Keep the derived data current after a subtitle got appended."""
+        self._fingerprint_appended()
+        self._interval_index = None
+        self._items_version += 1
+        try:
+            for mappings, items in self._items_cache.values():
+                items.append(self._subtitle_item(len(items), mappings))
+        except etree.XMLSyntaxError:
+            # ColumnarSubtitleSet only parses bad markup when it gets read,
+            # leave the error to the next subtitle_items() call
+            self._items_cache = {}
+
+    def _subtitle_updated(self, index):
+        """Keep the derived data current after a subtitle got updated."""
+        self._fingerprint_updated(index)
+        self._interval_index = None
+        self._items_version += 1
+        for mappings, items in self._items_cache.values():
+            items[index] = self._subtitle_item(index, mappings)
+
+    def _get_interval_index(self):
+        if self._interval_index is None:
+            self._interval_index = _CueIntervalIndex(self.subtitle_items())
+        return self._interval_index
+
+    def cues_at(self, ms):
+        """Return the subtitle_items() showing at ms, in order.
+
+        A subtitle shows from its start time up to, but not including, its
+        end time.  Unsynced subtitles (without a start time) never show, the
+        ones without an end time show until the end.
+        """
+        return self._get_interval_index().at(ms)
+
+    def cues_between(self, from_ms, to_ms):
+        """Return the subtitle_items() showing at some point between from_ms
+        and to_ms, in order.
+
+        Like cues_at() the window includes from_ms but not to_ms.
+        """
+        return self._get_interval_index().between(from_ms, to_ms)
+
+    def fingerprint(self):
+        """Return a digest of the subtitles.
+
+        The digest covers the start and end times, text, region and paragraph
+        breaks of each subtitle in order, i.e. everything __eq__ compares.  It
+        gets computed the first time it's needed and then kept current by
+        append_subtitle(), extend() and update().
+        """
+        if self._cue_hashes is None:
+            self._cue_hashes = [_cue_hash(item)
+                                for item in self.subtitle_items()]
+            self._fingerprint = sum(
+                (i + 1) * h for i, h in enumerate(self._cue_hashes)
+            ) % _FINGERPRINT_MODULUS
+        return '%032x' % self._fingerprint
+
+    def _fingerprint_appended(self):
+        if self._cue_hashes is not None:
+            h = _cue_hash(self._subtitle_item(len(self._cue_hashes)))
+            self._cue_hashes.append(h)
+            self._fingerprint = (self._fingerprint +
+                                 len(self._cue_hashes) * h
+                                 ) % _FINGERPRINT_MODULUS
+
+    def _fingerprint_updated(self, index):
+        if self._cue_hashes is not None:
+            if index < 0:
+                index += len(self._cue_hashes)
+            h = _cue_hash(self._subtitle_item(index))
+            self._fingerprint = (self._fingerprint + (index + 1) *
+                                 (h - self._cue_hashes[index])
+                                 ) % _FINGERPRINT_MODULUS
+            self._cue_hashes[index] = h
 
     def get_language(self):
         return self._ttml.get(XML + 'lang')
@@ -648,21 +1444,37 @@ class SubtitleSet(object):
              (1100, None, "world!")]
 
         """
-        subs = SubtitleSet(language_code=language_code)
+        subs = cls(language_code=language_code)
+        subs.extend(subtitles, escape=escape)
+        return subs
 
+    # ttp timing parameters on the root element and the
+    # time_expression_to_milliseconds() arguments they go to
+    _time_param_attrs = (
+        ('tickRate', 'tick_rate', int),
+        ('frameRate', 'frame_rate', int),
+        ('frameRateMultiplier', 'frame_rate_multiplier', str),
+        ('subFrameRate', 'sub_frame_rate', int),
+    )
 
-        for s in subtitles:
-            extra = {}
-            if len(s) > 3:
-               extra = s[3]
-               s = s[:-1]
-            extra['escape'] = escape
-            subs.append_subtitle( *s, **extra)
-        return subs
+    def _read_time_params(self):
+        return self._time_params_of(self._ttml)
+
+    @classmethod
+    def _time_params_of(cls, root):
+        params = {}
+        for attr, param, convert in cls._time_param_attrs:
+            value = get_attr(root, attr)
+            if value:
+                try:
+                    params[param] = convert(value)
+                except ValueError:
+                    pass
+        return params
 
     def _get_tick_rate(self):
         try:
-            tt = self.find_divs()[0]
+            tt = self._get_divs()[0]
         except IndexError as e:
             from babelsubs.parsers.base import SubtitleParserError
             raise SubtitleParserError(
@@ -674,8 +1486,9 @@ class SubtitleSet(object):
         return 1
  
     def __eq__(self, other):
-        if type(self) == type(other):
-            return not diff(self, other, None)['changed']
+        if isinstance(other, SubtitleSet):
+            return (len(self) == len(other) and
+                    self.fingerprint() == other.fingerprint())
         else:
             return False
 
@@ -686,7 +1499,209 @@ class SubtitleSet(object):
         raise NotImplementedError("Validation isnt working so far")
 
     def to_xml(self):
+        self._normalize_pending_times()
         return etree.tostring(self._ttml)
 
     def as_etree_node(self):
+        self._normalize_pending_times()
         return copy.deepcopy(self._ttml)
+
+class ColumnarSubtitleSet(SubtitleSet):
+    """SubtitleSet that keeps its cues in flat columns instead of a TTML tree.
+
+    Start and end times live in two parallel integer arrays (UNSYNCED marks a
+    missing time), the (already escaped) cue markup, regions and paragraph
+    flags in plain lists.  This is all the text based parsers and generators
+    need, so converting between them never has to build or walk an lxml tree:
+    the subtitle text is rendered straight from the markup strings.
+
+    The TTML tree is only built the first time something asks for it
+    (to_xml(), as_etree_node(), get_subtitles(), the DFXP generator, or any
+    direct access to _ttml).  From then on the columns are dropped and the
+    set behaves exactly like a regular SubtitleSet.
+    """
+    UNSYNCED = -1
+
+    def __init__(self, language_code, title=None, description=None):
+        self._language_code = language_code
+        self._title = title
+        self._description = description
+        self._columnar = True
+        self._starts = array('l')
+        self._ends = array('l')
+        self._markup = []
+        self._regions = []
+        self._new_paragraphs = []
+        self._times_pending = False
+        self.invalidate_cache()
+
+    def _get_ttml(self):
+        if self._columnar:
+            self._materialize()
+        return self.__dict__['_ttml']
+
+    def _set_ttml_attr(self, ttml):
+        self.__dict__['_ttml'] = ttml
+
+    def _get_body(self):
+        if self._columnar:
+            self._materialize()
+        return self.__dict__['_body']
+
+    def _set_body_attr(self, body):
+        self.__dict__['_body'] = body
+
+    _ttml = property(_get_ttml, _set_ttml_attr)
+    _body = property(_get_body, _set_body_attr)
+
+    @property
+    def is_materialized(self):
+        """True once the TTML tree has been built."""
+        return not self._columnar
+
+    def _materialize(self):
+        """Build the TTML tree from the columns and switch to tree mode."""
+        self._columnar = False
+        cue_hashes, fingerprint = self._cue_hashes, self._fingerprint
+        SubtitleSet.__init__(self, self._language_code, title=self._title,
+                             description=self._description)
+        SubtitleSet.extend(self, ((
+            self._time_at(self._starts, i),
+            self._time_at(self._ends, i),
+            self._markup[i], {
+                NEW_PARAGRAPH_META_KEY: self._new_paragraphs[i],
+                REGION_META_KEY: self._regions[i],
+            }) for i in xrange(len(self._markup))), escape=False)
+        self._starts = self._ends = None
+        self._markup = self._regions = self._new_paragraphs = None
+        # same subtitles, same fingerprint
+        self._cue_hashes, self._fingerprint = cue_hashes, fingerprint
+
+    def _time_at(self, column, index):
+        value = column[index]
+        if value == self.UNSYNCED:
+            return None
+        return value
+
+    def _to_column_value(self, milliseconds):
+        # same truncation milliseconds_to_time_clock_exp does when the time
+        # gets written to a begin/end attribute
+        if milliseconds is None:
+            return self.UNSYNCED
+        return int(milliseconds)
+
+    def __len__(self):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).__len__()
+        return len(self._markup)
+
+    def append_subtitle(self, from_ms, to_ms, content, new_paragraph=False,
+                        region=None, escape=True):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).append_subtitle(
+                from_ms, to_ms, content, new_paragraph=new_paragraph,
+                region=region, escape=escape)
+        if escape:
+            content = escape_xml(content)
+        self._starts.append(self._to_column_value(from_ms))
+        self._ends.append(self._to_column_value(to_ms))
+        self._markup.append(self._fix_xml_content(content))
+        self._regions.append(region or None)
+        self._new_paragraphs.append(bool(new_paragraph))
+        self._subtitle_appended()
+
+    def extend(self, subtitles, escape=True):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).extend(subtitles,
+                                                           escape=escape)
+        for s in subtitles:
+            meta = s[3] if len(s) > 3 and s[3] else {}
+            self.append_subtitle(s[0], s[1], s[2],
+                                 new_paragraph=meta.get(NEW_PARAGRAPH_META_KEY),
+                                 region=meta.get(REGION_META_KEY),
+                                 escape=escape)
+
+    def _iter_items_for(self, mappings_list):
+        if not self._columnar:
+            for items in super(ColumnarSubtitleSet,
+                               self)._iter_items_for(mappings_list):
+                yield items
+            return
+        distinct, slots = _distinct_mappings(mappings_list)
+        for i in xrange(len(self._markup)):
+            contents = self._contents_for_markup(self._markup[i], distinct)
+            from_ms = self._time_at(self._starts, i)
+            to_ms = self._time_at(self._ends, i)
+            new_paragraph = i == 0 or self._new_paragraphs[i]
+            items = [SubtitleLine(from_ms, to_ms, content,
+                                  {NEW_PARAGRAPH_META_KEY: new_paragraph,
+                                   REGION_META_KEY: self._regions[i]})
+                     for content in contents]
+            yield [items[slot] for slot in slots]
+
+    def _contents_for_markup(self, markup, mappings_list):
+        """The subtitle text of markup for each of mappings_list.
+
+        The markup the text based parsers produce is rendered straight from
+        the string, only anything fancier gets parsed into a <p> element.
+        """
+        events = _parse_inline_markup(markup)
+        if events is None:
+            el = self._create_subtitle_p(None, None, markup)
+            return [self._content_for_el(el, mappings)
+                    for mappings in mappings_list]
+        return [_render_inline_markup(events, mappings)
+                for mappings in mappings_list]
+
+    def _subtitle_item(self, index, mappings=None):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self)._subtitle_item(index,
+                                                                   mappings)
+        # the first cue always starts a paragraph, just like the first <p>
+        # of a div
+        meta = {
+            NEW_PARAGRAPH_META_KEY: index == 0 or self._new_paragraphs[index],
+            REGION_META_KEY: self._regions[index],
+        }
+        content, = self._contents_for_markup(self._markup[index], [mappings])
+        return SubtitleLine(self._time_at(self._starts, index),
+                            self._time_at(self._ends, index),
+                            content, meta)
+
+    @property
+    def fully_synced(self):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).fully_synced
+        return (self.UNSYNCED not in self._starts and
+                self.UNSYNCED not in self._ends)
+
+    def update(self, subtitle_index, from_ms=None, to_ms=None):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).update(
+                subtitle_index, from_ms=from_ms, to_ms=to_ms)
+        # raise IndexError for out of range indexes, like the tree does
+        self._markup[subtitle_index]
+        if from_ms is not None:
+            self._starts[subtitle_index] = int(from_ms)
+        if to_ms is not None:
+            self._ends[subtitle_index] = int(to_ms)
+        self._subtitle_updated(subtitle_index)
+
+    def _retime(self, retime_ms):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self)._retime(retime_ms)
+        unsynced = self.UNSYNCED
+        for column in (self._starts, self._ends):
+            for i, value in enumerate(column):
+                if value != unsynced:
+                    column[i] = retime_ms(value)
+
+    def get_language(self):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).get_language()
+        return self._language_code or ''
+
+    def set_language(self, language_code):
+        if not self._columnar:
+            return super(ColumnarSubtitleSet, self).set_language(language_code)
+        self._language_code = language_code
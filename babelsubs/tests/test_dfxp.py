@@ -104,6 +104,13 @@ class DFXPParsingTest(TestCase):
         sset = utils.get_subs('i-2376.dfxp').subtitle_set
         self.assertFalse(sset.fully_synced)
 
+    def test_comma_fraction(self):
+        items = utils.get_subs('i-2376.dfxp').subtitle_set.subtitle_items()
+        self.assertEqual([(item.start_time, item.end_time)
+                          for item in items[:5]],
+                         [(3503, 6236), (6236, 9237), (9237, 12311),
+                          (12311, 14837), (14837, None)])
+
     def test_regions(self):
         subs  = utils.get_subs("regions.dfxp")
         items = subs.to_internal().subtitle_items()
@@ -132,6 +139,79 @@ class LegacyDFXPTest(TestCase):
         sset = SubtitleSet(language_code='en', initial_data=cleaned)
         self.assertEqual(len(sset), 419)
 
+class DFXPStreamingTest(TestCase):
+    class ChunkedReader(object):
+        # hands out the file a few bytes at a time, so that tags and
+        # namespace declarations get split between reads
+        def __init__(self, filename, chunk_size=7):
+            self.f = open(utils.get_data_file_path(filename))
+            self.chunk_size = chunk_size
+
+        def read(self, size=-1):
+            return self.f.read(self.chunk_size)
+
+    def assert_same_as_string(self, filename):
+        with open(utils.get_data_file_path(filename)) as f:
+            from_string = SubtitleSet('en', f.read())
+        from_stream = SubtitleSet.from_stream('en',
+                                              self.ChunkedReader(filename))
+        utils.assert_long_text_equal(from_string.to_xml(),
+                                     from_stream.to_xml())
+
+    def test_same_as_string(self):
+        for filename in ('simple.dfxp', 'with-formatting.dfxp',
+                         'multiline-italics.dfxp', 'normalize-time.dfxp',
+                         'comments.dfxp', 'with-xml-literals.dfxp'):
+            self.assert_same_as_string(filename)
+
+    def test_legacy_namespace(self):
+        for filename in ('pre-dmr.dfxp', 'pre-dmr2.dfxp',
+                         'pre-dmr-whitespace.dfxp'):
+            self.assert_same_as_string(filename)
+        sset = SubtitleSet.from_stream('en', self.ChunkedReader('pre-dmr.dfxp'))
+        self.assertEqual(sset.to_xml().find(TTML_NAMESPACE_URI_LEGACY), -1)
+
+    def test_load_from_file_streams(self):
+        subs = utils.get_subs("simple.dfxp")
+        self.assertEquals(len(subs), 76)
+
+    def test_invalid(self):
+        with self.assertRaises(SubtitleParserError):
+            DFXPParser(self.ChunkedReader('simple.srt'), 'en')
+
+class DFXPLazyParsingTest(TestCase):
+    def test_same_as_subtitle_set(self):
+        for filename in ('simple.dfxp', 'with-formatting.dfxp',
+                         'normalize-time.dfxp', 'regions.dfxp',
+                         'pre-dmr.dfxp'):
+            content = open(utils.get_data_file_path(filename)).read()
+            parser = DFXPParser(content, 'en', eager_parse=False)
+            cues = [(cue['start'], cue['end'], cue['text'], cue['region'],
+                     cue['new_paragraph']) for cue in parser]
+            items = SubtitleSet('en', content).subtitle_items()
+            self.assertEqual(cues, [(item.start_time, item.end_time,
+                                     item.text, item.region,
+                                     item.new_paragraph) for item in items])
+
+    def test_only_parses_what_is_needed(self):
+        content = open(utils.get_data_file_path('simple.dfxp')).read()
+        # cut the document in the middle of the body
+        content = content[:len(content) // 2]
+        parser = DFXPParser(content, 'en', eager_parse=False)
+        self.assertEqual([cue['text'] for cue in parser[:2]],
+                         ["DAVID POGUE:Copper, symbol Cu.",
+                          "Atomic number 29--29 protons, 29 electrons."])
+        with self.assertRaises(SubtitleParserError):
+            parser.to_internal()
+        with self.assertRaises(SubtitleParserError):
+            len(parser)
+
+    def test_streams(self):
+        parser = DFXPParser(open(utils.get_data_file_path('simple.dfxp')),
+                            'en', eager_parse=False)
+        self.assertEqual(parser[75]['start'], parser[-1]['start'])
+        self.assertEqual(len(parser.to_internal()), 76)
+
 class DFXPMergeTest(TestCase):
     def setUp(self):
         self.en_subs = SubtitleSet('en')
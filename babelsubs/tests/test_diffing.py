@@ -1,5 +1,9 @@
+import difflib
+import random
 from unittest import TestCase
 from babelsubs.storage import SubtitleSet, SubtitleLine, diff, calc_changes
+from babelsubs import diffing
+from babelsubs.diffing import SequenceDiff
 
 class DiffingTest(TestCase):
     def test_empty_subs(self):
@@ -288,3 +292,69 @@ class DiffingTest(TestCase):
         text_changed, time_changed = calc_changes(set_1, set_2)
         self.assertAlmostEqual(time_changed, 0)
         self.assertAlmostEqual(text_changed, 2/8.0)
+
+    def test_large_sets(self):
+        subs = [(i * 1000, i * 1000 + 900, "Hey %s" % (i % 10))
+                for i in xrange(3000)]
+        set_1 = SubtitleSet.from_list('en', subs)
+        subs[1500] = (1500 * 1000, 1500 * 1000 + 900, "Changed")
+        set_2 = SubtitleSet.from_list('en', subs[:-1])
+        result = diff(set_1, set_2)
+        self.assertEqual(len(result['subtitle_data']), 3000)
+        self.assertAlmostEqual(result['text_changed'], 1 - 5996 / 5999.0)
+        self.assertAlmostEqual(result['time_changed'], 1 - 5998 / 5999.0)
+        changed = [i for i, data in enumerate(result['subtitle_data'])
+                   if data['text_changed']]
+        self.assertEqual(changed, [1500, 2999])
+
+class SequenceDiffTest(TestCase):
+    def check_blocks(self, a, b):
+        sd = SequenceDiff(a, b)
+        blocks = sd.get_matching_blocks()
+        self.assertEqual(blocks[-1], (len(a), len(b), 0))
+        for i, j, n in blocks:
+            self.assertEqual(a[i:i+n], b[j:j+n])
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in sd.get_opcodes():
+            rebuilt.extend(b[j1:j2])
+        self.assertEqual(rebuilt, list(b))
+        return sd
+
+    def test_matches_sequence_matcher(self):
+        for a, b in [('abcd', 'abcd'), ('abcd', 'bcde'), ('abxcd', 'abcd'),
+                     ('', 'abc'), ('abc', ''), ('abc', 'xyz'),
+                     ('qabxcd', 'abycdf')]:
+            sd = self.check_blocks(a, b)
+            sm = difflib.SequenceMatcher(None, a, b)
+            self.assertEqual(sd.get_opcodes(), sm.get_opcodes())
+            self.assertAlmostEqual(sd.ratio(), sm.ratio())
+
+    def test_repeated_items(self):
+        # no unique items, so this goes through the Myers bisection
+        sd = self.check_blocks('abababab', 'bababab')
+        self.assertAlmostEqual(sd.ratio(), 14 / 15.0)
+        sd = self.check_blocks('aabbaabb', 'bbaabbaa')
+        self.assertAlmostEqual(sd.ratio(), 12 / 16.0)
+
+    def test_expensive_bisection(self):
+        # a few values repeated all over, the edit cost goes way over the
+        # limit and the bisection cuts its search short
+        rng = random.Random(1)
+        a = [rng.randrange(3) for i in xrange(5000)]
+        b = [rng.randrange(3) for i in xrange(5000)]
+        sd = self.check_blocks(a, b)
+        # the optimal ratio is a bit under 0.7
+        self.assertTrue(sd.ratio() > 0.65, sd.ratio())
+
+    def test_cost_limit(self):
+        limit, diffing.MIN_COST_LIMIT = diffing.MIN_COST_LIMIT, 0
+        try:
+            # cut short after a couple of steps, still a valid diff
+            self.check_blocks('aabbaabbaabb', 'bbaabbaabbaa')
+            self.check_blocks('abcabcabcabc', 'cbacbacba')
+        finally:
+            diffing.MIN_COST_LIMIT = limit
+
+    def test_empty(self):
+        self.assertEqual(SequenceDiff([], []).ratio(), 1.0)
+        self.assertEqual(SequenceDiff([], []).get_opcodes(), [])
@@ -0,0 +1,61 @@
+from io import BytesIO
+from unittest import TestCase
+
+from babelsubs import (get_available_formats, load_from_file, to, to_stream,
+                       export_many)
+from babelsubs.generators.base import GeneratorList
+from babelsubs.storage import SubtitleSet
+from babelsubs.tests import utils
+
+class StreamingGeneratorTest(TestCase):
+    def check_streaming(self, subs):
+        for file_type in get_available_formats():
+            generator = GeneratorList[file_type](subs, language='en')
+            expected = to(subs, file_type, language='en')
+            self.assertEqual(u''.join(generator.iter_generate()), expected)
+            stream = BytesIO()
+            to_stream(subs, file_type, stream, language='en')
+            self.assertEqual(stream.getvalue(), expected.encode('utf-8'))
+
+    def test_all_formats(self):
+        for file_name in ['simple.srt', 'basic.vtt', 'simple.dfxp']:
+            path = utils.get_data_file_path(file_name)
+            self.check_streaming(load_from_file(path).to_internal())
+        self.check_streaming(SubtitleSet('en'))
+
+    def test_chunk_per_cue(self):
+        subs = load_from_file(utils.get_data_file_path('simple.srt'))
+        subs = subs.to_internal()
+        chunks = list(GeneratorList['srt'](subs).iter_generate())
+        self.assertEqual(len(chunks), len(subs))
+
+
+class ExportManyTest(TestCase):
+    def test_same_as_to(self):
+        types = ['srt', 'vtt', 'sbv', 'dfxp', 'json', 'ssa', 'txt', 'html']
+        for file_name in ['simple.srt', 'basic.vtt', 'simple.dfxp']:
+            path = utils.get_data_file_path(file_name)
+            subs = load_from_file(path).to_internal()
+            outputs = export_many(subs, types, language='en')
+            self.assertEqual(sorted(outputs), sorted(types))
+            for file_type in types:
+                self.assertEqual(outputs[file_type],
+                                 to(subs, file_type, language='en'))
+        self.assertEqual(export_many(SubtitleSet('en'), ['srt', 'vtt']),
+                         {'srt': u'', 'vtt': u'WEBVTT'})
+        self.assertRaises(KeyError, export_many, subs, ['srt', 'nope'])
+
+    def test_single_pass(self):
+        subs = load_from_file(utils.get_data_file_path('simple.srt'))
+        subs = subs.to_internal()
+        calls = []
+        def fail(*args):
+            raise AssertionError('items extracted per generator')
+        subs.iter_subtitle_items = subs.subtitle_items = fail
+        iter_items_for = subs.iter_subtitle_items_for
+        def counting(mappings_list):
+            calls.append(mappings_list)
+            return iter_items_for(mappings_list)
+        subs.iter_subtitle_items_for = counting
+        export_many(subs, ['srt', 'vtt', 'txt', 'json', 'dfxp'])
+        self.assertEqual(len(calls), 1)
@@ -2,7 +2,8 @@ from unittest import TestCase
 
 from babelsubs.generators.json_generator import JSONGenerator
 from babelsubs import SubtitleParserError
-from babelsubs.parsers.json_parser import JSONParser
+from babelsubs.parsers import json_parser
+from babelsubs.parsers.json_parser import JSONParser, iter_json_array
 from babelsubs.tests import utils
 import json
 
@@ -23,3 +24,69 @@ class JSONParserTest(TestCase):
         with self.assertRaises(SubtitleParserError):
             JSONParser ("this\n\nisnot a valid subs format","en")
 
+
+    def parse(self, data, eager_parse=True):
+        return JSONParser(json.dumps(data), '', language='en',
+                          eager_parse=eager_parse)
+
+    def test_round_trip(self):
+        subs = utils.get_subs("simple.srt").to_internal()
+        parser = JSONParser(JSONGenerator.generate(subs), '')
+        self.assertEquals([item[:2] for item in parser.to_internal().subtitle_items()],
+                          [item[:2] for item in subs.subtitle_items()])
+
+    def test_unordered_positions(self):
+        data = [{'start': 3000, 'end': 4000, 'text': 'two', 'position': 2},
+                {'start': 1000, 'end': 2000, 'text': 'one', 'position': 1},
+                {'start': 5000, 'end': 6000, 'text': 'three', 'position': 3}]
+        texts = ['one', 'two', 'three']
+        subs = self.parse(data).to_internal()
+        self.assertEquals([item.text for item in subs.subtitle_items()], texts)
+        self.assertEquals([cue['text'] for cue in self.parse(data, False)],
+                          texts)
+        parser = self.parse(data, False)
+        self.assertEquals(parser[0]['text'], 'one')
+        self.assertEquals(parser[1]['text'], 'two')
+        self.assertEquals([cue['text'] for cue in parser[:2]], texts[:2])
+        self.assertEquals(len(parser), 3)
+
+    def test_decoded_as_handed_out(self):
+        content = JSONGenerator.generate(utils.get_subs("simple.srt").to_internal())
+        decoded = []
+        decoder = json_parser._decoder
+        class CountingDecoder(object):
+            def raw_decode(self, text, position):
+                decoded.append(position)
+                return decoder.raw_decode(text, position)
+        json_parser._decoder = CountingDecoder()
+        try:
+            parser = JSONParser(content, '', language='en', eager_parse=False)
+            self.assertEquals(parser[0]['start'], 4)
+            self.assertEquals(len(decoded), 1)
+            parser = JSONParser(content, '', language='en', eager_parse=False)
+            self.assertEquals(next(iter(parser))['start'], 4)
+            self.assertEquals(len(decoded), 2)
+        finally:
+            json_parser._decoder = decoder
+
+    def test_repeated_positions(self):
+        data = [{'start': 1000, 'end': 2000, 'text': 'one', 'position': 1},
+                {'start': 2000, 'end': 3000, 'text': 'two', 'position': 2},
+                {'start': 3000, 'end': 4000, 'text': 'three', 'position': 3},
+                {'start': 2500, 'end': 3000, 'text': 'two b', 'position': 2}]
+        subs = self.parse(data).to_internal()
+        self.assertEquals([item.text for item in subs.subtitle_items()],
+                          ['one', 'two', 'two b', 'three'])
+        # the cues handed out before the repeat showed up stay as they were
+        self.assertEquals([cue['text'] for cue in self.parse(data, False)],
+                          ['one', 'two', 'three', 'two b'])
+
+    def test_iter_json_array(self):
+        self.assertEquals(list(iter_json_array(' [ ] ')), [])
+        self.assertEquals(list(iter_json_array('[{"a": [1]} ,2,"x"]\n')),
+                          [{'a': [1]}, 2, 'x'])
+        for invalid in ('', '{}', '[1 2]', '[1,]', '[1] 2', '[1'):
+            self.assertRaises(ValueError, list, iter_json_array(invalid))
+        with self.assertRaises(SubtitleParserError):
+            JSONParser('[{"start": 1, "end": 2, "text": "a", "position": 1}',
+                       '')
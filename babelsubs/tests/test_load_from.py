@@ -1,5 +1,9 @@
+from io import BytesIO
 from unittest import TestCase
-from babelsubs import load_from, load_from_file
+from babelsubs import (
+    load_from, load_from_file, detect_format, to, parse_parallel,
+    SubtitleParserError
+)
 from babelsubs.tests import utils
 
 
@@ -24,9 +28,80 @@ class LoadFromTest(TestCase):
         parsed = subs.to_internal()
         self.assertEquals(len(parsed), 19)
 
-    def test_from_string_requires_type(self):
+    def test_from_string_guesses_type(self):
         data = open(utils.get_data_file_path("simple-srt.badextension"), 'r').read()
-        self.assertRaises(TypeError, load_from, data)
+        parsed = load_from(data).to_internal()
+        self.assertEquals(len(parsed), 19)
+
+    def test_from_string_requires_type(self):
+        self.assertRaises(TypeError, load_from, "just some text")
+
+    def test_content_beats_extension(self):
+        f = open(utils.get_data_file_path("simple.ssa"))
+        f = BytesIO(f.read())
+        f.name = 'simple.srt'
+        parsed = load_from(f).to_internal()
+        self.assertEquals(len(parsed), 19)
+
+
+class DetectFormatTest(TestCase):
+    def check_data_file(self, file_name, file_type):
+        data = open(utils.get_data_file_path(file_name)).read()
+        self.assertEquals(detect_format(data)[0], file_type)
+
+    def test_data_files(self):
+        self.check_data_file("simple-srt.badextension", 'srt')
+        self.check_data_file("Untimed_text.srt", 'srt')
+        self.check_data_file("Untimed_text.vtt", 'vtt')
+        self.check_data_file("basic.vtt", 'vtt')
+        self.check_data_file("simple.sbv", 'sbv')
+        self.check_data_file("simple.ssa", 'ssa')
+        self.check_data_file("simple.dfxp", 'dfxp')
+        self.check_data_file("from-n.dfxp", 'dfxp')
+        self.check_data_file("youtube.xml", 'youtube')
+
+    def test_json(self):
+        subs = load_from_file(utils.get_data_file_path("simple.srt"))
+        self.assertEquals(detect_format(to(subs.to_internal(), 'json')), ['json'])
+        self.assertEquals(detect_format(' []'), ['json'])
+
+    def test_ranking(self):
+        # a WebVTT file with SRT-like cues is still WebVTT
+        self.assertEquals(detect_format("WEBVTT\n\n1\n00:00:01,000 --> "
+                                        "00:00:02,000\nhi\n"),
+                          ['vtt', 'srt'])
+
+    def test_only_looks_at_the_start(self):
+        self.assertEquals(detect_format("x" * 10000 + "\n[Script Info]"), [])
+        self.assertEquals(detect_format(""), [])
+
+
+class ParseParallelTest(TestCase):
+    def check_same_as_load_from(self, file_name, type):
+        content = open(utils.get_data_file_path(file_name)).read()
+        expected = load_from(content, type).to_internal()
+        subs = parse_parallel(content, type, workers=2, chunk_size=100)
+        self.assertEquals(subs.subtitle_items(), expected.subtitle_items())
 
+    def test_same_as_load_from(self):
+        self.check_same_as_load_from("simple.srt", 'srt')
+        self.check_same_as_load_from("timed_text.srt", 'srt')
+        self.check_same_as_load_from("basic.vtt", 'vtt')
+        self.check_same_as_load_from("regions.vtt", 'vtt')
+        self.check_same_as_load_from("simple.sbv", 'sbv')
+        self.check_same_as_load_from("simple.ssa", 'ssa')
+        self.check_same_as_load_from("simple.dfxp", 'dfxp')
 
+    def test_cut_at_cue_boundaries(self):
+        # lots of small chunks, none of the cues may get lost or cut in two
+        content = u''.join(u"%d\n00:00:%02d,000 --> 00:00:%02d,500\n"
+                           u"cue %d\n\n" % (i + 1, i % 60, i % 60, i)
+                           for i in xrange(300))
+        subs = parse_parallel(content, 'srt', workers=2, chunk_size=50)
+        self.assertEquals([item.text for item in subs.subtitle_items()],
+                          [u'cue %d' % i for i in xrange(300)])
 
+    def test_invalid(self):
+        self.assertRaises(SubtitleParserError, parse_parallel,
+                          "not\n\nsubtitles\n\n" * 100, 'srt', workers=2,
+                          chunk_size=100)
@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+from babelsubs import load_from_file, to
+from babelsubs.parsers import discover, SubtitleParserError
+from babelsubs.tests import utils
+
+class LazyParsingTest(TestCase):
+    def lazy_parser(self, file_type, content):
+        parser = discover(file_type)
+        if file_type == 'json':
+            return parser(content, '', language='en', eager_parse=False)
+        return parser(content, 'en', eager_parse=False)
+
+    def check_lazy_parsing(self, file_type, content):
+        parser = self.lazy_parser(file_type, content)
+        self.assertFalse(hasattr(parser, 'sub_set'))
+        self.assertFalse(hasattr(parser, 'subtitle_set'))
+        first, second = parser[0], parser[1]
+        self.assertEqual(parser[0:2], [first, second])
+        self.assertEqual(parser[-1], list(parser)[-1])
+        self.assertEqual(parser[::-1][-1], first)
+        self.assertRaises(IndexError, lambda: parser[len(parser)])
+        self.assertFalse(hasattr(parser, 'sub_set'))
+        self.assertFalse(hasattr(parser, 'subtitle_set'))
+
+        def ms(time):
+            return None if time is None else int(time)
+        items = parser.to_internal().subtitle_items()
+        self.assertEqual(len(parser), len(items))
+        self.assertEqual([(ms(cue['start']), ms(cue['end'])) for cue in parser],
+                         [(item.start_time, item.end_time) for item in items])
+
+    def test_all_formats(self):
+        for file_type, file_name in [('srt', 'simple.srt'),
+                                     ('vtt', 'basic.vtt'),
+                                     ('sbv', 'simple.sbv'),
+                                     ('ssa', 'simple.ssa'),
+                                     ('dfxp', 'simple.dfxp'),
+                                     ('youtube', 'youtube.xml')]:
+            content = open(utils.get_data_file_path(file_name)).read()
+            if file_type != 'dfxp':
+                content = content.decode('utf-8')
+            self.check_lazy_parsing(file_type, content)
+        subs = load_from_file(utils.get_data_file_path('simple.srt'))
+        self.check_lazy_parsing('json', to(subs.to_internal(), 'json'))
+        self.check_lazy_parsing('txt', to(subs.to_internal(), 'txt'))
+
+    def test_invalid_header(self):
+        for file_type, content in [('dfxp', '<html></html>'),
+                                   ('youtube', '<tt></tt>'),
+                                   ('json', '{"a": 1}')]:
+            self.assertRaises(SubtitleParserError, self.lazy_parser,
+                              file_type, content)
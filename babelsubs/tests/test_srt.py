@@ -1,9 +1,11 @@
+from StringIO import StringIO
 from unittest import TestCase
 
 from lxml import etree
 from babelsubs.storage import get_contents, SubtitleSet, TTS_NAMESPACE_URI
 from babelsubs.generators.srt import SRTGenerator
 from babelsubs.parsers import SubtitleParserError
+from babelsubs.parsers import srt
 from babelsubs.parsers.srt import SRTParser
 from babelsubs.tests import utils
 
@@ -156,6 +158,76 @@ And know, Mr. <b>Amara</b> will talk.\n >> Hello, and welcome.
         with self.assertRaises(SubtitleParserError):
             SRTParser ("this\n\nisnot a valid subs format","en")
 
+    def test_pathological_input(self):
+        def parse(content):
+            return SRTParser(content, 'en', eager_parse=False).to_internal()
+        # a long run of digits used to be scanned again from every digit
+        utils.assert_lines_scanned_once(parse,
+            u"1\n00:00:01,000 --> 00:00:02,000\nok\n\n" + u"1" * 10000, srt)
+        # no blank lines between the cues
+        utils.assert_lines_scanned_once(parse,
+            u"1\n00:00:01,000 --> 00:00:02,000\ntext\n" * 2000, srt)
+
+    def test_scanned_once(self):
+        content = open(utils.get_data_file_path("simple.srt")).read()
+        parser = SRTParser(content.decode('utf-8'), 'en', eager_parse=False)
+        scans = []
+        match_dicts = parser._match_dicts
+        def counting_match_dicts():
+            scans.append(1)
+            return match_dicts()
+        parser._match_dicts = counting_match_dicts
+        self.assertTrue(parser)
+        self.assertEqual(len(parser), 19)
+        self.assertEqual(len(list(parser)), 19)
+        self.assertEqual(len(parser.to_internal()), 19)
+        self.assertTrue(parser)
+        self.assertEqual(len(parser), 19)
+        self.assertEqual(len(list(parser)), 19)
+        self.assertEqual(len(scans), 1)
+
+    def test_eager_scanned_once(self):
+        content = open(utils.get_data_file_path("simple.srt")).read()
+        scans = []
+        match_dicts = SRTParser._match_dicts
+        def counting_match_dicts(parser):
+            scans.append(1)
+            return match_dicts(parser)
+        SRTParser._match_dicts = counting_match_dicts
+        try:
+            parser = SRTParser(content.decode('utf-8'), 'en')
+            self.assertTrue(parser)
+            self.assertEqual(len(parser), 19)
+            self.assertEqual(len(parser), 19)
+            self.assertEqual(len(list(parser)), 19)
+        finally:
+            SRTParser._match_dicts = match_dicts
+        self.assertEqual(len(scans), 1)
+
+    def test_stream_matches_not_cached(self):
+        path = utils.get_data_file_path("simple.srt")
+        parser = SRTParser(open(path), 'en', eager_parse=False)
+        self.assertTrue(parser)
+        self.assertEqual(next(iter(parser))['start'], 4)
+        # a stream is read once, every cue comes out a single time
+        self.assertEqual(len(list(parser)), 18)
+        self.assertEqual(parser._match_cache, None)
+        parser = SRTParser(open(path), 'en')
+        self.assertEqual(len(parser), 19)
+        self.assertEqual(parser._match_cache, None)
+
+    def test_markup_translation(self):
+        parser = SRTParser(u"1\n00:00:01,000 --> 00:00:02,000\nx\n", 'en')
+        text = u"no markup at all"
+        self.assertTrue(parser.get_markup(text) is text)
+        self.assertEqual(parser.get_markup(u"a & b > c\nd &lt; &eacute;"),
+                         u"a &amp; b &gt; c<br />d &lt; \xe9")
+        self.assertEqual(parser.get_markup(
+            u"<B><i>both</i> bold</b> <font color='red'>red</font><u>open"),
+            u'<span fontWeight="bold"><span fontStyle="italic">both</span>'
+            u' bold</span> red<span textDecoration="underline">open</span>')
+        self.assertEqual(parser.get_markup(u"</i>x <!-- hi --><b"), u"x ")
+
     def test_mixed_newlines(self):
         # some folks will have valid srts, then edit them on an editor
         # that will save line breaks on the current platform separator
@@ -247,3 +319,43 @@ class SRTMultiLines(TestCase):
         self.assertEqual(expected, 
                          self.dfxp.get_content_with_markup(els[7], 
                          mappings=SRTGenerator.MAPPINGS))
+
+class SRTStreamingTest(TestCase):
+
+    def parse_both(self, content):
+        from_string = SRTParser(content, 'en').to_internal()
+        from_stream = SRTParser(StringIO(content.encode('utf-8')),
+                                'en').to_internal()
+        return from_string.subtitle_items(), from_stream.subtitle_items()
+
+    def test_data_files(self):
+        for name in ("simple.srt", "Timed_en.srt", "Untimed_text.srt",
+                     "curly_brackets.srt", "timed_text.srt"):
+            content = open(utils.get_data_file_path(name)).read()
+            from_string, from_stream = self.parse_both(content.decode('utf-8'))
+            self.assertEqual(from_string, from_stream)
+
+    def test_odd_cues(self):
+        content = (u"junk before\n1\n\n  \n"
+                   u"00:00:01,000 --> 00:00:02,000\nfirst\nline 2\n\n"
+                   u"2\n00:00:03,000 --> 00:00:04,000\n\n"
+                   u"not a cue\n00:00:05,000 --> 00:00:06,000\nskipped\n\n"
+                   u"3\r\n00:00:07,000 --> 00:00:08,000\r\nwindows\r\n\r\n"
+                   u"4\r00:00:09,000 --> 00:00:10,000\rmac\r\r"
+                   u"5\n00:00:11,000 --> 00:00:12,000\nno blank line at the end")
+        from_string, from_stream = self.parse_both(content)
+        self.assertEqual(len(from_stream), 5)
+        self.assertEqual(from_string, from_stream)
+
+    def test_lazy_iteration(self):
+        stream = StringIO("1\n00:00:01,000 --> 00:00:02,000\nfirst\n\n"
+                          "2\n00:00:03,000 --> 00:00:04,000\nsecond\n")
+        parser = SRTParser(stream, 'en', eager_parse=False)
+        cues = iter(parser)
+        self.assertEqual(cues.next()['text'], 'first')
+        # only the first cue has been read so far
+        self.assertEqual(stream.readline(), "2\n")
+
+    def test_invalid(self):
+        with self.assertRaises(SubtitleParserError):
+            SRTParser(StringIO("this\n\nisnot a valid subs format"), "en")
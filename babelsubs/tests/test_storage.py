@@ -1,7 +1,8 @@
 from lxml import etree
 from unittest import TestCase
+import warnings
 
-from babelsubs import storage
+from babelsubs import load_from_file, storage, to
 from babelsubs.generators.html import HTMLGenerator
 from babelsubs.generators.srt import SRTGenerator
 from babelsubs.parsers import SubtitleParserError
@@ -78,6 +79,31 @@ class TimeHandlingTest(TestCase):
             self.assertNotIn('dur', el.attrib)
         self.assertEqual(subs[5].attrib['end'], '00:01:05.540')
 
+    def test_lazy_normalize_time(self):
+        content_str = open(utils.get_data_file_path("normalize-time.dfxp") ).read()
+        eager = storage.SubtitleSet('en', content_str, normalize_time=True)
+        lazy = storage.SubtitleSet('en', content_str,
+                                   normalize_time=storage.LAZY_NORMALIZE_TIME)
+        self.assertEqual(len(eager), len(lazy))
+        self.assertEqual(eager.fully_synced, lazy.fully_synced)
+        # nothing gets rewritten until the times are read or serialized
+        self.assertIn('dur', lazy._get_subtitle_els()[0].attrib)
+        self.assertEqual(eager.subtitle_items(), lazy.subtitle_items())
+        self.assertIn('dur', lazy._get_subtitle_els()[0].attrib)
+        self.assertEqual(lazy._get_subtitle_els()[5].attrib['end'], '65.54s')
+        self.assertEqual(eager.to_xml(), lazy.to_xml())
+        self.assertNotIn('dur', lazy._get_subtitle_els()[0].attrib)
+
+    def test_lazy_normalize_time_update(self):
+        content_str = open(utils.get_data_file_path("normalize-time.dfxp") ).read()
+        lazy = storage.SubtitleSet('en', content_str,
+                                   normalize_time=storage.LAZY_NORMALIZE_TIME)
+        end_time = lazy.subtitle_items()[5].end_time
+        lazy.update(5, from_ms=60000)
+        self.assertEqual(lazy.subtitle_items()[5].start_time, 60000)
+        self.assertEqual(lazy.subtitle_items()[5].end_time, end_time)
+        self.assertEqual(lazy.get_subtitles()[5].attrib['end'], '00:01:05.540')
+
 class AddSubtitlesTest(TestCase):
 
     def _paragraphs_in_div(self, el):
@@ -177,12 +203,53 @@ class AddSubtitlesTest(TestCase):
                             italics="<i>%s</i>", underline="<u>%s</u>")),
                           'a <u>word on <i>nested spans</i></u>')
 
+    def test_combined_styles_with_markup(self):
+        subs = storage.SubtitleSet('en')
+        subs.append_subtitle(0, 1000,
+            '<span fontWeight="bold" fontStyle="italic" '
+            'textDecoration="underline">a<!-- c --> <span fontStyle="normal">'
+            '100%</span><br/>b</span> &amp; <span>c</span>', escape=False)
+        el = subs.get_subtitles()[0]
+        mappings = dict(linebreaks="|", bold="<b>%s</b>", italics="*%s*",
+                        quote_text=main_utils.escape_html_text)
+        self.assertEqual(subs.get_content_with_markup(el, mappings),
+                         '<b>*a 100%|b*</b> &amp; c')
+        mappings['underline'] = "<u>%s</u>"
+        self.assertEqual(subs.get_content_with_markup(el, mappings),
+                         '<b>*<u>a 100%|b</u>*</b> &amp; c')
+
     def test_region(self):
         subs = storage.SubtitleSet('en')
         subs.append_subtitle(0, 1000, "test", region="top")
         elt = subs.get_subtitles()[0]
         self.assertEqual(elt.attrib['region'], 'top')
 
+    def test_extend_matches_append(self):
+        subs = [
+            (0, 1000, 'Hey <span fontWeight="bold">you</span>', {}),
+            (1000, 2000, "line<br/>break", {'region': 'top'}),
+            (2000, None, "new paragraph", {'new_paragraph': True}),
+            (None, None, u"\xe9t\xe9\x15", None),
+        ]
+        appended = storage.SubtitleSet('en')
+        for from_ms, to_ms, content, meta in subs:
+            appended.append_subtitle(from_ms, to_ms, content, escape=False,
+                                     **(meta or {}))
+        extended = storage.SubtitleSet('en')
+        extended.extend(subs, escape=False)
+        utils.assert_long_text_equal(appended.to_xml(), extended.to_xml())
+        self.assertEqual(len(extended), 4)
+        self.assertEqual(len(extended.find_divs()), 2)
+
+    def test_extend_bad_markup(self):
+        dfxp = storage.SubtitleSet('en')
+        self.assertRaises(etree.XMLSyntaxError, dfxp.extend, [
+            (0, 1000, "fine"),
+            (1000, 2000, "</p><p>sneaky"),
+        ], escape=False)
+        # the subtitles before the bad one still get added
+        self.assertEqual(len(dfxp), 1)
+
 class AccessTest(TestCase):
 
     def test_indexing(self):
@@ -195,6 +262,79 @@ class AccessTest(TestCase):
         self.assertIsNotNone(ss[0])
         self.assertIsNotNone(ss[1])
 
+    def test_subtitles_attribute(self):
+        ss = storage.SubtitleSet.from_list('en', [(0, 1000, 'Hi')])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(ss.subtitles, ss.subtitle_items())
+            ss.append_subtitle(2000, 3000, 'Bye')
+            self.assertEqual(ss.subtitles[-1].text, 'Bye')
+        self.assertEqual(caught[0].category, DeprecationWarning)
+
+class ItemsCacheTest(TestCase):
+    def check_cache(self, subs):
+        mappings = SRTGenerator.MAPPINGS
+        formatted = subs.subtitle_items(mappings)
+        self.assertEqual(formatted[0].text, 'one\r\ntwo')
+        self.assertEqual(subs.subtitle_items(mappings), formatted)
+        self.assertTrue(subs.subtitle_items(mappings)[0] is formatted[0])
+        # indexing always gives the plain text
+        self.assertEqual(subs[0].text, 'onetwo')
+
+        subs.append_subtitle(2000, 3000, 'three')
+        subs.update(0, from_ms=100)
+        items = subs.subtitle_items(mappings)
+        self.assertEqual([(item.start_time, item.text) for item in items],
+                         [(100, 'one\r\ntwo'), (2000, 'three')])
+        self.assertEqual(subs[-1].text, 'three')
+        self.assertEqual(items, [item for item in subs.iter_subtitle_items(
+            dict(linebreaks='\r\n'))])
+
+        subs.shift(1000)
+        self.assertEqual([item.start_time for item in
+                          subs.iter_subtitle_items(mappings)], [1100, 3000])
+        self.assertEqual(subs[0].start_time, 1100)
+
+    def test_tree(self):
+        self.check_cache(storage.SubtitleSet.from_list('en', [
+            (0, 1000, 'one<br/>two')]))
+
+    def test_columnar(self):
+        subs = storage.ColumnarSubtitleSet('en')
+        subs.append_subtitle(0, 1000, 'one<br/>two', escape=False)
+        self.check_cache(subs)
+
+    def test_partial_iteration(self):
+        subs = storage.SubtitleSet.from_list('en', [
+            (0, 1000, 'one'), (1000, 2000, 'two')])
+        items = subs.iter_subtitle_items()
+        items.next()
+        subs.append_subtitle(2000, 3000, 'three')
+        list(items)
+        self.assertEqual(len(subs.subtitle_items()), 3)
+
+    def check_handed_out_elements(self, subs):
+        other = storage.SubtitleSet.from_list('en', [
+            (0, 1000, 'one'), (1000, 2000, 'two')])
+        self.assertEqual(subs.subtitle_items()[1].start_time, 1000)
+        self.assertEqual(subs, other)
+        self.assertEqual(len(subs.cues_at(500)), 1)
+        el = subs.get_subtitles()[1]
+        el.set('begin', '00:00:00.500')
+        self.assertEqual(subs.subtitle_items()[1].start_time, 500)
+        self.assertEqual(subs[1].start_time, 500)
+        self.assertNotEqual(subs, other)
+        self.assertEqual(len(subs.cues_at(500)), 2)
+
+    def test_handed_out_elements(self):
+        self.check_handed_out_elements(storage.SubtitleSet.from_list('en', [
+            (0, 1000, 'one'), (1000, 2000, 'two')]))
+
+    def test_handed_out_elements_columnar(self):
+        subs = storage.ColumnarSubtitleSet('en')
+        subs.extend([(0, 1000, 'one'), (1000, 2000, 'two')])
+        self.check_handed_out_elements(subs)
+
 class ParsingTest(TestCase):
 
     def test_f_dfxp(self):
@@ -235,12 +375,159 @@ class UpdateTest(TestCase):
         for i,sub in enumerate(dfxp_updated.subtitle_items()):
             self.assertEqual(i * 1000, sub.end_time)
 
+    def test_index_follows_appends(self):
+        dfxp = utils.get_subs("pre-dmr.dfxp").to_internal()
+        count = len(dfxp)
+        dfxp.append_subtitle(0, 1000, "appended")
+        dfxp.append_subtitle(1000, 2000, "new paragraph", new_paragraph=True)
+        self.assertEqual(len(dfxp), count + 2)
+        dfxp.update(count + 1, from_ms=1500)
+        self.assertEqual(dfxp.subtitle_items()[-1].start_time, 1500)
+        self.assertEqual(dfxp.get_subtitles(),
+                         storage.find_els(dfxp._ttml, '/tt/body/div/p'))
+
+    def test_invalidate_cache(self):
+        dfxp = utils.get_subs("pre-dmr.dfxp").to_internal()
+        count = len(dfxp)
+        div = dfxp.last_div()
+        div.remove(div[-1])
+        dfxp.invalidate_cache()
+        self.assertEqual(len(dfxp), count - 1)
+
     def test_update_language_code(self):
         subs = utils.get_subs("simple.dfxp").to_internal()
         subs.set_language('fr')
         lang_attr_name = '{http://www.w3.org/XML/1998/namespace}lang'
         self.assertEquals(subs._ttml.get(lang_attr_name), 'fr')
 
+class FingerprintTest(TestCase):
+
+    def test_same_content(self):
+        dfxp = utils.get_subs("pre-dmr.dfxp").to_internal()
+        other = utils.get_subs("pre-dmr.dfxp").to_internal()
+        self.assertEqual(dfxp.fingerprint(), other.fingerprint())
+        self.assertEqual(dfxp, other)
+
+    def test_follows_changes(self):
+        dfxp = utils.get_subs("pre-dmr.dfxp").to_internal()
+        other = utils.get_subs("pre-dmr.dfxp").to_internal()
+        original = dfxp.fingerprint()
+        dfxp.update(1, from_ms=123456)
+        self.assertNotEqual(dfxp.fingerprint(), original)
+        self.assertNotEqual(dfxp, other)
+        other.update(1, from_ms=123456)
+        self.assertEqual(dfxp, other)
+
+        dfxp.append_subtitle(0, 1000, "appended", region="top")
+        other.append_subtitle(0, 1000, "appended")
+        self.assertNotEqual(dfxp, other)
+        # the incrementally updated digest matches a fresh one
+        fingerprint = dfxp.fingerprint()
+        dfxp.invalidate_cache()
+        self.assertEqual(dfxp.fingerprint(), fingerprint)
+
+    def test_paragraphs(self):
+        subs = storage.SubtitleSet.from_list('en', [
+            (0, 1000, "one"), (1000, 2000, "two")])
+        split = storage.SubtitleSet.from_list('en', [
+            (0, 1000, "one"), (1000, 2000, "two", {'new_paragraph': True})])
+        self.assertNotEqual(subs.fingerprint(), split.fingerprint())
+
+class IntervalIndexTest(TestCase):
+    def setUp(self):
+        self.subs = storage.SubtitleSet.from_list('en', [
+            (0, 1000, "one"),
+            (500, 3000, "long"),
+            (1000, 2000, "two"),
+            (None, None, "unsynced"),
+            (4000, None, "open ended"),
+        ])
+
+    def texts(self, items):
+        return [item.text for item in items]
+
+    def test_cues_at(self):
+        self.assertEqual(self.texts(self.subs.cues_at(0)), ["one"])
+        self.assertEqual(self.texts(self.subs.cues_at(999)), ["one", "long"])
+        self.assertEqual(self.texts(self.subs.cues_at(1000)), ["long", "two"])
+        self.assertEqual(self.texts(self.subs.cues_at(3500)), [])
+        self.assertEqual(self.texts(self.subs.cues_at(99999)), ["open ended"])
+        self.assertEqual(self.subs.cues_at(-1), [])
+
+    def test_cues_between(self):
+        self.assertEqual(self.texts(self.subs.cues_between(2500, 4001)),
+                         ["long", "open ended"])
+        self.assertEqual(self.texts(self.subs.cues_between(0, 500)), ["one"])
+        self.assertEqual(self.texts(self.subs.cues_between(3000, 4000)), [])
+
+    def test_follows_changes(self):
+        self.assertEqual(self.subs.cues_at(3500), [])
+        self.subs.update(3, from_ms=3200, to_ms=3600)
+        self.assertEqual(self.texts(self.subs.cues_at(3500)), ["unsynced"])
+        self.subs.append_subtitle(3400, 3700, "appended")
+        self.assertEqual(self.texts(self.subs.cues_at(3500)),
+                         ["unsynced", "appended"])
+
+    def test_columnar(self):
+        columnar = storage.ColumnarSubtitleSet('en')
+        columnar.extend(self.subs.subtitle_items())
+        self.assertEqual(columnar.cues_between(0, 5000),
+                         self.subs.cues_between(0, 5000))
+        self.assertFalse(columnar.is_materialized)
+
+class RetimeTest(TestCase):
+    def setUp(self):
+        self.items = [
+            (1000, 2000, "one"),
+            (2000, None, "no end"),
+            (None, None, "unsynced"),
+        ]
+
+    def times(self, subs):
+        return [(item.start_time, item.end_time)
+                for item in subs.subtitle_items()]
+
+    def test_shift(self):
+        subs = storage.SubtitleSet.from_list('en', self.items)
+        subs.shift(-1500)
+        self.assertEqual(self.times(subs),
+                         [(0, 500), (500, None), (None, None)])
+
+    def test_frame_rate(self):
+        subs = storage.SubtitleSet.from_list('en', self.items)
+        columnar = storage.ColumnarSubtitleSet('en')
+        columnar.extend(self.items)
+        for s in (subs, columnar):
+            s.convert_frame_rate(25, 24)
+        self.assertEqual(self.times(subs),
+                         [(1042, 2083), (2083, None), (None, None)])
+        self.assertEqual(self.times(columnar), self.times(subs))
+        self.assertFalse(columnar.is_materialized)
+
+    def test_piecewise(self):
+        subs = storage.SubtitleSet.from_list('en', self.items)
+        subs.retime_piecewise([(0, 0), (1000, 2000), (2000, 2500)])
+        self.assertEqual(self.times(subs),
+                         [(2000, 2500), (2500, None), (None, None)])
+
+    def test_lazy_normalized(self):
+        subs = utils.get_subs("pre-dmr.dfxp").to_internal()
+        lazy = storage.SubtitleSet('en', subs.to_xml(),
+                                   normalize_time=storage.LAZY_NORMALIZE_TIME)
+        subs.scale(2)
+        lazy.scale(2)
+        self.assertEqual(self.times(lazy), self.times(subs))
+
+    def test_derived_data(self):
+        subs = storage.SubtitleSet.from_list('en', self.items)
+        fingerprint = subs.fingerprint()
+        self.assertEqual(subs.cues_at(2500)[0].text, "no end")
+        subs[0]
+        subs.shift(1000)
+        self.assertNotEqual(subs.fingerprint(), fingerprint)
+        self.assertEqual(subs.cues_at(2500)[0].text, "one")
+        self.assertEqual(subs[0].start_time, 2000)
+
 class SubtitleXMLFormattingTest(TestCase):
     def setUp(self):
         ttml = etree.fromstring('<tt xmlns="http://www.w3.org/ns/ttml" xmlns:tts="http://www.w3.org/ns/ttml#styling" xml:lang="en"><head/><body><div/></body></tt>')
@@ -290,3 +577,108 @@ class SubtitleXMLFormattingTest(TestCase):
     </body>
 </tt>
 """)
+
+class ColumnarSubtitleSetTest(TestCase):
+    def setUp(self):
+        self.subs = [
+            (0, 1000, "Hey <a>html anchor</a>", {'new_paragraph': True}),
+            (1000, 2000, "second & line", {'region': 'top'}),
+            (2000, None, "third\x15 line", {'new_paragraph': True}),
+            (None, None, "unsynced", {}),
+        ]
+
+    def _make_sets(self):
+        tree = storage.SubtitleSet('en')
+        columnar = storage.ColumnarSubtitleSet('en')
+        for from_ms, to_ms, content, extra in self.subs:
+            tree.append_subtitle(from_ms, to_ms, content, **extra)
+            columnar.append_subtitle(from_ms, to_ms, content, **extra)
+        return tree, columnar
+
+    def test_items_match_tree(self):
+        tree, columnar = self._make_sets()
+        self.assertEqual(len(columnar), 4)
+        self.assertEqual(tree.subtitle_items(), columnar.subtitle_items())
+        self.assertEqual(tree.subtitle_items(HTMLGenerator.MAPPINGS),
+                         columnar.subtitle_items(HTMLGenerator.MAPPINGS))
+        self.assertEqual(tree, columnar)
+        self.assertFalse(columnar.fully_synced)
+        self.assertFalse(columnar.is_materialized)
+
+    def test_update(self):
+        tree, columnar = self._make_sets()
+        tree.update(3, from_ms=3000, to_ms=4000)
+        columnar.update(3, from_ms=3000, to_ms=4000)
+        tree.update(2, to_ms=3000)
+        columnar.update(2, to_ms=3000)
+        self.assertEqual(tree.subtitle_items(), columnar.subtitle_items())
+        self.assertTrue(columnar.fully_synced)
+        self.assertRaises(IndexError, columnar.update, 10, 0, 0)
+
+    def test_materialize(self):
+        tree, columnar = self._make_sets()
+        self.assertFalse(columnar.is_materialized)
+        utils.assert_long_text_equal(tree.to_xml(), columnar.to_xml())
+        self.assertTrue(columnar.is_materialized)
+        # once the tree is built, everything goes through it
+        columnar.append_subtitle(5000, 6000, "after")
+        self.assertEqual(len(columnar.get_subtitles()), 5)
+        self.assertEqual(columnar.subtitle_items()[-1].text, "after")
+
+    def test_language(self):
+        columnar = storage.ColumnarSubtitleSet('en')
+        columnar.set_language('fr')
+        self.assertEqual(columnar.get_language(), 'fr')
+        self.assertEqual(columnar.as_etree_node().get(
+            '{http://www.w3.org/XML/1998/namespace}lang'), 'fr')
+
+    def test_text_parsers_stay_columnar(self):
+        parsed = utils.get_subs("simple.srt").to_internal()
+        self.assertTrue(isinstance(parsed, storage.ColumnarSubtitleSet))
+        unicode(SRTGenerator(parsed))
+        self.assertFalse(parsed.is_materialized)
+
+    def test_markup_without_lxml(self):
+        columnar = storage.ColumnarSubtitleSet('en')
+        tree = storage.SubtitleSet('en')
+        for markup in ['plain', '<span fontWeight="bold">a &amp; b</span>',
+                       '<span fontStyle="italic" textDecoration="underline">'
+                       '<span fontWeight="bold"/>x</span><br/>&#233;',
+                       ' 100% <br />\n<span>%s</span> ']:
+            columnar.append_subtitle(0, 1000, markup, escape=False)
+            tree.append_subtitle(0, 1000, markup, escape=False)
+        fromstring = storage.etree.fromstring
+        def no_lxml(*args, **kwargs):
+            raise AssertionError('built a <p> element')
+        storage.etree.fromstring = no_lxml
+        try:
+            for mappings in (None, SRTGenerator.MAPPINGS,
+                             HTMLGenerator.MAPPINGS):
+                self.assertEqual(columnar.subtitle_items(mappings),
+                                 tree.subtitle_items(mappings))
+        finally:
+            storage.etree.fromstring = fromstring
+        self.assertFalse(columnar.is_materialized)
+
+    def test_markup_needing_lxml(self):
+        tree, columnar = self._make_sets()
+        # <a> isn't one of the tags the text parsers produce
+        self.assertEqual(columnar.subtitle_items(HTMLGenerator.MAPPINGS),
+                         tree.subtitle_items(HTMLGenerator.MAPPINGS))
+        columnar.append_subtitle(0, 0, '<span>unclosed', escape=False)
+        self.assertRaises(etree.XMLSyntaxError, columnar.subtitle_items)
+
+    def test_text_conversion(self):
+        # the columns give the same output as the TTML tree
+        types = ['srt', 'vtt', 'sbv', 'ssa', 'txt', 'json']
+        for file_name in ['simple.srt', 'Timed_en.srt', 'curly_brackets.srt',
+                          'basic.vtt', 'voice-span.vtt', 'regions.vtt',
+                          'simple.sbv', 'simple.ssa']:
+            path = utils.get_data_file_path(file_name)
+            subs = load_from_file(path).to_internal()
+            direct = [to(subs, file_type) for file_type in types]
+            self.assertFalse(subs.is_materialized)
+            subs.to_xml()
+            self.assertTrue(subs.is_materialized)
+            self.assertEqual(direct,
+                             [to(subs, file_type) for file_type in types])
@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+from babelsubs import timing
+from babelsubs.loader import SubtitleLoader
+from babelsubs.storage import SubtitleSet
+
+
+class TimeExpressionTest(TestCase):
+
+    def assertTime(self, expression, milliseconds, **params):
+        self.assertAlmostEqual(
+            timing.parse_time_expression(expression, **params), milliseconds)
+
+    def test_clock_time(self):
+        self.assertTime("00:00:01", 1000)
+        self.assertTime("01:02:03", 3723000)
+        self.assertTime("100:00:00", 360000000)
+
+    def test_clock_time_fraction(self):
+        self.assertTime("00:00:01.200", 1200)
+        self.assertTime("00:00:01.2", 1200)
+        self.assertTime("00:00:01.25", 1250)
+        self.assertTime("00:00:01.2005", 1201)
+        self.assertTime("00:00:03,503", 3503)
+
+    def test_clock_time_frames(self):
+        self.assertTime("00:00:01:15", 1500)
+        self.assertTime("00:00:01:12", 1500, frame_rate=24)
+        self.assertTime("00:00:01:12.1", 1521, frame_rate=24,
+                        sub_frame_rate=2)
+        # 30 * 1000 / 1001 fps
+        self.assertTime("00:00:00:30", 1001, frame_rate=30,
+                        frame_rate_multiplier="1000 1001")
+
+    def test_offset_time(self):
+        self.assertTime("10h", 10 * 3600 * 1000)
+        self.assertTime("1.5m", 90 * 1000)
+        self.assertTime("65.54s", 65540)
+        self.assertTime("5000ms", 5000)
+        self.assertTime("50f", 2000, frame_rate=25)
+        self.assertTime("50f", 2002, frame_rate=25,
+                        frame_rate_multiplier="1000 1001")
+        self.assertTime("20t", 2000, tick_rate=10)
+        self.assertRaises(ValueError, timing.parse_time_expression, "20t")
+
+    def test_invalid(self):
+        for expression in ("", "abc", "1:00:00", "00:1:00", "10", "10x",
+                           "00:00:01:5"):
+            self.assertEqual(timing.parse_time_expression(expression), None)
+
+    def test_memoized(self):
+        timing.parse_time_expression("00:00:07.123")
+        self.assertIn("00:00:07.123", timing._scan_cache)
+
+    def test_plain_clock_time(self):
+        self.assertTrue(timing.is_plain_clock_time("00:00:01.000"))
+        self.assertFalse(timing.is_plain_clock_time("00:00:01:10"))
+        self.assertFalse(timing.is_plain_clock_time("1000ms"))
+
+    def test_format_clock_time(self):
+        self.assertEqual(timing.format_clock_time(3723004), "01:02:03.004")
+        self.assertEqual(timing.format_clock_time(1500.9), "00:00:01.500")
+
+    def test_piecewise_linear(self):
+        mapping = timing.piecewise_linear([(10000, 12000), (0, 1000)])
+        self.assertEqual(mapping(0), 1000)
+        self.assertEqual(mapping(5000), 6500)
+        # outside the points we follow the nearest segment
+        self.assertEqual(mapping(20000), 23000)
+        self.assertEqual(mapping(-1000), -100)
+        self.assertEqual(timing.piecewise_linear([(1000, 500)])(3000), 2500)
+        self.assertRaises(ValueError, timing.piecewise_linear, [])
+        self.assertRaises(ValueError, timing.piecewise_linear,
+                          [(0, 0), (0, 10)])
+
+class FrameRateNormalizationTest(TestCase):
+
+    def test_frame_rate_from_root(self):
+        loader = SubtitleLoader()
+        loader.add_style('default')
+        loader.add_region('bottom', 'default')
+        subs = loader.create_new('en', frame_rate='25')
+        subs.last_div().append(subs.last_div().makeelement(
+            '{http://www.w3.org/ns/ttml}p', begin="00:00:01:10", dur="25f"))
+        subs = SubtitleSet('en', subs.to_xml())
+        item = subs.subtitle_items()[0]
+        self.assertEqual(item.start_time, 1400)
+        self.assertEqual(item.end_time, 2400)
+        self.assertEqual(subs.get_subtitles()[0].get('begin'), '00:00:01.400')
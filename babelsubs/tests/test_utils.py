@@ -0,0 +1,54 @@
+# encoding: utf-8
+import codecs
+import glob
+import os
+from unittest import TestCase
+
+from babelsubs import utils
+
+try:
+    import bleach
+except ImportError:
+    bleach = None
+
+
+def corpus():
+    """Every test data file, as a whole and line by line."""
+    texts = []
+    data_dir = os.path.join(os.path.dirname(__file__), 'data')
+    for path in sorted(glob.glob(os.path.join(data_dir, '*'))):
+        with open(path) as f:
+            content = f.read()
+        if content.startswith(codecs.BOM_UTF16_LE):
+            content = content.decode('utf-16')
+        else:
+            content = content.decode('utf-8-sig')
+        texts.append(content)
+        texts.extend(content.splitlines())
+    return texts
+
+def bleach_strip_tags(text):
+    return bleach.clean(text, tags=utils.DEFAULT_ALLOWED_TAGS, strip=True)
+
+
+class StripTagsTest(TestCase):
+
+    def test_strip_tags(self):
+        self.assertEqual(utils.strip_tags(''), u'')
+        self.assertEqual(utils.strip_tags('caçao'), u'caçao')
+        self.assertEqual(utils.strip_tags(u'<B>bold</b> <p>and</p> <i>it'),
+                         u'<b>bold</b> and <i>it</i>')
+        self.assertEqual(utils.strip_tags(u'<b x="1>2">a</b><!-- c -->'),
+                         u'<b>a</b>')
+        self.assertEqual(utils.strip_tags(u'<b>1<i>2</b>3</i>'),
+                         u'<b>1<i>2</i></b><i>3</i>')
+        self.assertEqual(utils.strip_tags(u'a &lt; b &amp c > d &#233;'),
+                         u'a &lt; b &amp; c &gt; d é')
+        self.assertEqual(utils.strip_tags(u'a\r\nb<b>c', tags=['i']),
+                         u'a\nbc')
+
+    def test_same_as_bleach(self):
+        if bleach is None:
+            self.skipTest('bleach is not installed')
+        for text in corpus() + [u'<b>1<i>2</b>3</i>', u'&notit; &#x80;']:
+            self.assertEqual(utils.strip_tags(text), bleach_strip_tags(text))
@@ -4,6 +4,7 @@ from lxml import etree
 from babelsubs.storage import get_contents, SubtitleSet, TTS_NAMESPACE_URI
 from babelsubs.generators.webvtt import WEBVTTGenerator
 from babelsubs.parsers import SubtitleParserError
+from babelsubs.parsers import webvtt
 from babelsubs.parsers.webvtt	 import WEBVTTParser
 from babelsubs.tests import utils
 
@@ -88,6 +89,16 @@ class WEBVTTParsingTest(TestCase):
         for sub in items[4:]:
             self.assertEquals(sub.region, None)
 
+    def test_pathological_input(self):
+        def parse(content):
+            return WEBVTTParser(content, 'en', eager_parse=False).to_internal()
+        # no blank lines between the cues
+        utils.assert_lines_scanned_once(parse,
+            u"WEBVTT\n\n" + u"00:01.000 --> 00:02.000\ntext\n" * 2000, webvtt)
+        utils.assert_lines_scanned_once(parse,
+            u"WEBVTT\n\n00:01.000 --> 00:02.000\nok\n\n" +
+            u"00:00." + u"0" * 10000, webvtt)
+
 class WEBVTTGeneratorTest(TestCase):
 
     def test_generated_formatting(self):
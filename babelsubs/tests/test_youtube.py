@@ -1,6 +1,7 @@
 from unittest import TestCase
 
 from babelsubs.parsers.youtube import YoutubeParser
+from babelsubs import load_from_file
 from babelsubs.tests import utils
 
 
@@ -23,3 +24,33 @@ class YouTubeParsingTest(TestCase):
         # last one should be hard coded to last 3 seconds
         self.assertEquals(sub_data[79].end_time, 213370)
 
+    def test_duration(self):
+        parser = YoutubeParser('<transcript>'
+                               '<text start="1" dur="0.5">a</text>'
+                               '<text start="2">b</text>'
+                               '<text start="4" dur="1.25">c</text>'
+                               '<text start="4.5" dur="2">d</text>'
+                               '</transcript>', 'en')
+        # dur wins over the start of the next sub
+        self.assertEquals([(cue['start'], cue['end']) for cue in parser],
+                          [(1000, 1500), (2000, 4000), (4000, 5250),
+                           (4500, 6500)])
+
+
+    def test_stream(self):
+        from_string = self._get_subs("youtube-no-end.xml")
+        from_stream = YoutubeParser(
+            open(utils.get_data_file_path("youtube-no-end.xml")),
+            'en').to_internal()
+        self.assertEquals(from_string.subtitle_items(),
+                          from_stream.subtitle_items())
+        subs = load_from_file(utils.get_data_file_path("youtube.xml"),
+                              type='youtube').to_internal()
+        self.assertEquals(len(subs), 31)
+
+    def test_entities(self):
+        parser = YoutubeParser('<transcript><text start="1" dur="2">'
+                               'it&amp;#39;s &lt;font color="#E5E5E5"&gt;'
+                               'caf&amp;eacute;&lt;/font&gt;\n&amp;amp; more'
+                               '</text></transcript>', 'en')
+        self.assertEquals(parser[0]['text'], u"it's caf\xe9\n& more")
@@ -20,3 +20,48 @@ def assert_long_text_equal(text1, text2):
                                     fromfile="string1",
                                     tofile="string2")
         raise AssertionError("strings differ: %s" % ''.join(diff))
+
+class CountingRegex(object):
+    """Wraps a compiled regex, counting the calls and the characters it's
+    tried on."""
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.calls = 0
+        self.chars = 0
+
+    def __getattr__(self, name):
+        return getattr(self.regex, name)
+
+    def _count(self, string):
+        self.calls += 1
+        self.chars += len(string)
+
+    def match(self, string, *args):
+        self._count(string)
+        return self.regex.match(string, *args)
+
+    def search(self, string, *args):
+        self._count(string)
+        return self.regex.search(string, *args)
+
+def assert_lines_scanned_once(parse, content, module,
+                              regex_name='_TIMING_LINE_RE'):
+    """Check that parse(content) tries module.<regex_name> on each line of
+    content at most once.
+
+    The regexes used on a single line are linear on its length, so this
+    keeps parsing linear on the input whatever it looks like.
+    """
+    regex = getattr(module, regex_name)
+    counting = CountingRegex(regex)
+    setattr(module, regex_name, counting)
+    try:
+        parse(content)
+    finally:
+        setattr(module, regex_name, regex)
+    lines = content.count('\n') + 1
+    if counting.calls > lines or counting.chars > len(content):
+        raise AssertionError("%d lines (%d characters) took %d regex calls "
+                             "on %d characters" % (lines, len(content),
+                             counting.calls, counting.chars))
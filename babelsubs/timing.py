@@ -0,0 +1,204 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2012 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""babelsubs.timing -- TTML time expressions.
+
+Implements the timeExpression grammar from
+http://www.w3.org/TR/ttaf1-dfxp/#timing-value-timeExpression
+
+    clock-time  : hours ":" minutes ":" seconds
+                  ( fraction | ":" frames ( "." sub-frames )? )?
+    offset-time : time-count fraction? metric
+    metric      : "h" | "m" | "s" | "ms" | "f" | "t"
+
+Expressions are scanned once and the result is memoized, since the same
+begin/end strings show up over and over again.
+"""
+
+from bisect import bisect_right
+
+DEFAULT_FRAME_RATE = 30
+DEFAULT_SUB_FRAME_RATE = 1
+
+CLOCK_TIME = 'clock'
+OFFSET_TIME = 'offset'
+
+_DIGITS = '0123456789'
+_METRIC_MULTIPLIERS = {
+    'h': 3600 * 1000,
+    'm': 60 * 1000,
+    's': 1000,
+    'ms': 1,
+}
+
+# scanned expressions, cleared when it gets too big
+_scan_cache = {}
+_SCAN_CACHE_SIZE = 65536
+
+def _scan_digits(expression, i, n):
+    start = i
+    while i < n and expression[i] in _DIGITS:
+        i += 1
+    return expression[start:i], i
+
+def _scan(expression):
+    """Scan a time expression into a tuple, or None if it can't be parsed.
+
+    Clock times become (CLOCK_TIME, hours, minutes, seconds, fraction,
+    frames, sub_frames), fraction being the digits after the dot (or
+    comma), offset times become (OFFSET_TIME, count, metric).  Like the
+    regexes we used to have, anything after a valid expression is ignored.
+    """
+    n = len(expression)
+    first, i = _scan_digits(expression, 0, n)
+    if not first:
+        return None
+
+    if i < n and expression[i] == ':':
+        if len(first) < 2:
+            return None
+        minutes, i = _scan_digits(expression, i + 1, n)
+        if len(minutes) != 2 or i >= n or expression[i] != ':':
+            return None
+        seconds, i = _scan_digits(expression, i + 1, n)
+        if len(seconds) != 2:
+            return None
+        fraction = frames = sub_frames = None
+        # some files use a comma (like srt does) instead of the dot
+        if i < n and expression[i] in '.,':
+            fraction, i = _scan_digits(expression, i + 1, n)
+        elif i < n and expression[i] == ':':
+            frames, i = _scan_digits(expression, i + 1, n)
+            if len(frames) < 2:
+                return None
+            if i < n and expression[i] == '.':
+                sub_frames, i = _scan_digits(expression, i + 1, n)
+        return (CLOCK_TIME, int(first), int(minutes), int(seconds),
+                fraction or None, frames and int(frames),
+                sub_frames and int(sub_frames))
+
+    count = first
+    if i < n and expression[i] == '.':
+        fraction, i = _scan_digits(expression, i + 1, n)
+        if not fraction:
+            return None
+        count = '%s.%s' % (first, fraction)
+    if expression.startswith('ms', i):
+        metric = 'ms'
+    elif i < n and expression[i] in 'hmsft':
+        metric = expression[i]
+    else:
+        return None
+    return (OFFSET_TIME, float(count), metric)
+
+def scan_time_expression(expression):
+    """Memoized version of _scan()."""
+    try:
+        return _scan_cache[expression]
+    except KeyError:
+        pass
+    if len(_scan_cache) >= _SCAN_CACHE_SIZE:
+        _scan_cache.clear()
+    scanned = _scan_cache[expression] = _scan(expression)
+    return scanned
+
+def effective_frame_rate(frame_rate=None, frame_rate_multiplier=None):
+    """Frames per second for ttp:frameRate and ttp:frameRateMultiplier.
+
+    frame_rate_multiplier can be given either as the attribute value
+    ("1000 1001") or as a number.
+    """
+    rate = float(frame_rate or DEFAULT_FRAME_RATE)
+    if frame_rate_multiplier:
+        if isinstance(frame_rate_multiplier, basestring):
+            numerator, denominator = frame_rate_multiplier.split()
+            rate = rate * int(numerator) / int(denominator)
+        else:
+            rate = rate * frame_rate_multiplier
+    return rate
+
+def parse_time_expression(expression, tick_rate=None, frame_rate=None,
+                          frame_rate_multiplier=None, sub_frame_rate=None):
+    """Convert a time expression to milliseconds.
+
+    Returns None if the expression can't be parsed.  Frames use frame_rate
+    (30 if not given) and frame_rate_multiplier, ticks need tick_rate.
+    Clock times give back an int, offset times a float.
+    """
+    scanned = scan_time_expression(expression)
+    if scanned is None:
+        return None
+    if scanned[0] == CLOCK_TIME:
+        (_, hours, minutes, seconds, fraction, frames,
+         sub_frames) = scanned
+        milliseconds = ((hours * 3600) + (minutes * 60) + seconds) * 1000
+        if fraction:
+            milliseconds += int(round(float('0.' + fraction) * 1000))
+        elif frames is not None:
+            frames += float(sub_frames or 0) / (sub_frame_rate or
+                                                DEFAULT_SUB_FRAME_RATE)
+            milliseconds += int(round(1000 * frames / effective_frame_rate(
+                frame_rate, frame_rate_multiplier)))
+        return milliseconds
+
+    _, count, metric = scanned
+    if metric == 't':
+        if not tick_rate:
+            raise ValueError("Ticks need a tick rate, mate.")
+        return 1000 * (count / float(tick_rate))
+    if metric == 'f':
+        return 1000 * count / effective_frame_rate(frame_rate,
+                                                   frame_rate_multiplier)
+    return count * _METRIC_MULTIPLIERS[metric]
+
+def is_plain_clock_time(expression):
+    """True if expression is a clock time without frames."""
+    scanned = scan_time_expression(expression)
+    return (scanned is not None and scanned[0] == CLOCK_TIME and
+            scanned[5] is None)
+
+def format_clock_time(milliseconds):
+    """Format milliseconds as a HH:MM:SS.mmm clock time."""
+    seconds, milliseconds = divmod(int(milliseconds), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%02d:%02d:%02d.%03d' % (hours, minutes, seconds, milliseconds)
+
+def piecewise_linear(points):
+    """Return a function mapping times through the (old, new) points.
+
+    Times between two points are interpolated linearly, times before the
+    first or after the last point follow the first or last segment.  A
+    single point is a plain shift.
+    """
+    points = sorted(points)
+    if not points:
+        raise ValueError("At least one point is needed")
+    olds = [old for old, new in points]
+    if len(set(olds)) != len(olds):
+        raise ValueError("Points need distinct times")
+    if len(points) == 1:
+        offset = points[0][1] - points[0][0]
+        return lambda milliseconds: milliseconds + offset
+    slopes = [float(new2 - new1) / (old2 - old1)
+              for (old1, new1), (old2, new2) in zip(points, points[1:])]
+
+    def mapping(milliseconds):
+        i = min(max(bisect_right(olds, milliseconds) - 1, 0), len(slopes) - 1)
+        old, new = points[i]
+        return new + (milliseconds - old) * slopes[i]
+    return mapping
@@ -1,8 +1,5 @@
 import re
-import bleach
-import htmllib
 import htmlentitydefs
-import formatter
 
 from itertools import chain
 from xmlconst import *
@@ -18,13 +15,14 @@ UNSYNCED_TIME_FULL = (60 * 60 * 100 * 1000) - 1
 UNSYNCED_TIME_ONE_HOUR_DIGIT = (60 * 60 * 10 * 1000) - 1000
 
 def unescape_html(s):
-    p = htmllib.HTMLParser(formatter.NullFormatter() )
-    # we need to preserve line breaks, nofill makes sure we don't
-    # loose them
-    p.nofill = True
-    p.save_bgn()
-    p.feed(s)
-    return p.save_end().strip()
+    """Get the text of an html fragment: tags are dropped, entities decoded
+    and line breaks kept.
+    """
+    if '<' in s:
+        s = HTML_TAG_RE.sub('', s)
+    if '&' in s:
+        s = entities_to_chars(s)
+    return s.strip()
 
 LANG_DIALECT_RE = re.compile(r'(?P<lang_code>[\w]{2,13})(?P<dialect>-[\w]{2,8})?(?P<rest>-[\w]*)?')
 
@@ -87,11 +85,237 @@ def strip_tags(text, tags=None):
     By default we allow the standard formatting tags
     to pass (i,b,u).
     Any other tag's content will be present, but with tags removed.
+
+    The output is the same bleach.clean(text, tags=tags, strip=True) gives
+    (see _sanitized_html()), without building a DOM for every call.
     """
     if tags is None:
         tags = DEFAULT_ALLOWED_TAGS
-    return bleach.clean(text, tags=tags, strip=True)
-
+    if not text:
+        return u''
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if not _HTML_SPECIAL_CHARS_RE.search(text):
+        return text
+    content = []
+    for kind, data in _sanitized_html(text, tags):
+        if kind is _TEXT:
+            content.append(escape_html_text(data))
+        elif kind is _START_TAG:
+            content.append(u'<%s>' % data)
+        else:
+            content.append(u'</%s>' % data)
+    return u''.join(content)
+
+# the characters that make strip_tags() do more than returning the text
+_HTML_SPECIAL_CHARS_RE = re.compile(u'[<>&\x00]')
+# comments, tags and the other things starting with a '<' html parsers drop,
+# the groups being the '/' of end tags, the tag name and the '>' ending it.
+# As in html parsers, whatever isn't finished takes up the rest of the text.
+HTML_TAG_RE = re.compile(r'''
+    <(?:
+        !--(?:-?>|.*?(?:--!?>|\Z))
+      | [!?][^>]*(?:>|\Z)
+      | /(?:>|[^a-zA-Z>][^>]*(?:>|\Z))
+      | (/?)([a-zA-Z][^\s/>]*)
+        (?:[\s/]+|[^\s/>][^\s/>=]*
+           (?:\s*=\s*(?:"[^"]*(?:"|\Z)|'[^']*(?:'|\Z)|[^\s>]*))?)*
+        (?:(>)|\Z)
+    )''', re.DOTALL | re.VERBOSE)
+HTML_ENTITY_RE = re.compile(r'&#?\w+;')
+# character references the way html parsers read them: the semicolon is
+# optional and named ones can be followed by more letters
+HTML_CHAR_REF_RE = re.compile(
+    r'&(?:#[xX]([0-9a-fA-F]+);?|#([0-9]+);?|([a-zA-Z][a-zA-Z0-9]*;?))')
+# named references that work without the trailing semicolon
+LEGACY_ENTITIES = frozenset(
+    [name for name, codepoint in htmlentitydefs.name2codepoint.items()
+     if codepoint < 256] + ['AMP', 'COPY', 'GT', 'LT', 'QUOT', 'REG'])
+LEGACY_ENTITY_CODEPOINTS = {'AMP': 38, 'COPY': 169, 'GT': 62, 'LT': 60,
+                            'QUOT': 34, 'REG': 174}
+_LONGEST_LEGACY_ENTITY = max(len(name) for name in LEGACY_ENTITIES)
+
+def _char_for_codepoint(codepoint):
+    if codepoint == 0 or 0xD800 <= codepoint <= 0xDFFF or codepoint > 0x10FFFF:
+        return u'\ufffd'
+    if 0x80 <= codepoint <= 0x9F:
+        # the windows-1252 characters people meant
+        try:
+            return chr(codepoint).decode('cp1252')
+        except UnicodeDecodeError:
+            pass
+    try:
+        return unichr(codepoint)
+    except ValueError:
+        # narrow python build
+        return ('\\U%08x' % codepoint).decode('unicode-escape')
+
+def _replace_char_ref(match):
+    hex_digits, digits, name = match.groups()
+    if name is None:
+        return _char_for_codepoint(int(hex_digits or digits,
+                                       16 if hex_digits else 10))
+    if name.endswith(';'):
+        codepoint = (htmlentitydefs.name2codepoint.get(name[:-1]) or
+                     LEGACY_ENTITY_CODEPOINTS.get(name[:-1]))
+        if codepoint is None and name == 'apos;':
+            codepoint = 39
+        if codepoint is not None:
+            return unichr(codepoint)
+    for end in xrange(min(len(name), _LONGEST_LEGACY_ENTITY), 1, -1):
+        prefix = name[:end]
+        if prefix in LEGACY_ENTITIES:
+            codepoint = (htmlentitydefs.name2codepoint.get(prefix) or
+                         LEGACY_ENTITY_CODEPOINTS[prefix])
+            return unichr(codepoint) + name[end:]
+    return match.group()
+
+def decode_html_entities(text):
+    """Replace character references in html text by the characters."""
+    if '&' not in text:
+        return text
+    return HTML_CHAR_REF_RE.sub(_replace_char_ref, text)
+
+def escape_html_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _html_text(data):
+    # null characters are dropped, ending any character reference
+    if u'\x00' in data:
+        return u''.join(decode_html_entities(part)
+                        for part in data.split(u'\x00'))
+    return decode_html_entities(data)
+
+_TEXT, _START_TAG, _END_TAG = 'text', 'start', 'end'
+
+class _Element(object):
+    # compared by identity: the same tag can be open more than once
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+def _sanitized_html(text, tags):
+    """Parse an html fragment keeping only the tags in tags.
+
+    Yields (_TEXT, text), (_START_TAG, name) and (_END_TAG, name) tuples for
+    the tree an html5 parser builds out of the text, when any tag not in
+    tags (and any comment) gets dropped before it reaches the tree builder.
+    That's what bleach does with strip=True.
+
+    The allowed tags are handled as formatting elements (like b, i or u),
+    which is all we need: misnested ones get closed and reopened, unclosed
+    ones get closed at the end.  Text has its character references decoded.
+    """
+    # the tags that are open, and the ones that got closed by a misnested end
+    # tag and get reopened when more content comes (html5's list of active
+    # formatting elements).
+    open_elements = []
+    active = []
+
+    def reconstruct():
+        if not active or active[-1] in open_elements:
+            return
+        start = len(active) - 1
+        while start > 0 and active[start - 1] not in open_elements:
+            start -= 1
+        for i in xrange(start, len(active)):
+            element = _Element(active[i].name)
+            active[i] = element
+            open_elements.append(element)
+            yield (_START_TAG, element.name)
+
+    def close_until(element):
+        while True:
+            closed = open_elements.pop()
+            yield (_END_TAG, closed.name)
+            if closed is element:
+                return
+
+    position = 0
+    for match in HTML_TAG_RE.finditer(text):
+        before = _html_text(text[position:match.start()])
+        position = match.end()
+        if before:
+            for event in reconstruct():
+                yield event
+            yield (_TEXT, before)
+        closing, name, finished = match.groups()
+        if name is None or not finished:
+            continue
+        name = name.lower()
+        if name not in tags:
+            continue
+        if not closing:
+            for event in reconstruct():
+                yield event
+            element = _Element(name)
+            open_elements.append(element)
+            yield (_START_TAG, name)
+            # no more than 3 of the same element get reopened
+            same = [e for e in active if e.name == name]
+            if len(same) == 3:
+                active.remove(same[0])
+            active.append(element)
+            continue
+        element = None
+        for e in reversed(active):
+            if e.name == name:
+                element = e
+                break
+        if element is not None:
+            active.remove(element)
+            if element in open_elements:
+                for event in close_until(element):
+                    yield event
+            continue
+        for e in reversed(open_elements):
+            if e.name == name:
+                for event in close_until(e):
+                    yield event
+                break
+    rest = _html_text(text[position:])
+    if rest:
+        for event in reconstruct():
+            yield event
+        yield (_TEXT, rest)
+    while open_elements:
+        yield (_END_TAG, open_elements.pop().name)
+
+# the TTML markup for the inline tags SRT and WebVTT support
+TTML_SPAN_FOR_TAG = {
+    'b': '<span fontWeight="bold">',
+    'i': '<span fontStyle="italic">',
+    'u': '<span textDecoration="underline">',
+}
+
+def html_markup_to_ttml(text):
+    """Convert text with html like markup to TTML markup.
+
+    This is what strip_tags() followed by parsing the result as xml used to
+    do for SRT and WebVTT, in a single pass: <b>, <i> and <u> become spans,
+    any other tag and comment gets dropped keeping its content, entities are
+    decoded and the text is escaped again for xml.  Line breaks become
+    <br />.
+
+    Text without any markup, ampersands or line breaks is returned as is.
+    """
+    if '<' not in text:
+        if '&' not in text and '>' not in text and '\n' not in text:
+            return text
+        return escape_html_text(_html_text(text)).replace('\n', '<br />')
+
+    content = []
+    for kind, data in _sanitized_html(text, TTML_SPAN_FOR_TAG):
+        if kind is _TEXT:
+            content.append(escape_html_text(data).replace('\n', '<br />'))
+        elif kind is _START_TAG:
+            content.append(TTML_SPAN_FOR_TAG[data])
+        else:
+            content.append('</span>')
+    return ''.join(content)
 
 def escape_ampersands(text):
     """Take a string of chars and replace ampersands with &amp;"""
@@ -103,25 +327,28 @@ def entities_to_chars(text):
     http://effbot.org/zone/re-sub.htm#unescape-html
 
     """
-    def fixup(m):
-        text = m.group(0)
-        if text[:2] == "&#":
-            # character reference
-            try:
-                if text[:3] == "&#x":
-                    return unichr(int(text[3:-1], 16))
-                else:
-                    return unichr(int(text[2:-1]))
-            except ValueError:
-                pass
-        else:
-            # named entity
-            try:
-                text = unichr(htmlentitydefs.name2codepoint[text[1:-1]])
-            except KeyError:
-                pass
-        return text # leave as is
-    return re.sub("&#?\w+;", fixup, text)
+    return HTML_ENTITY_RE.sub(_entity_to_char, text)
+
+# the characters for the named entities, for entities_to_chars()
+ENTITY_CHARS = dict(('&%s;' % name, unichr(codepoint))
+                    for name, codepoint in htmlentitydefs.name2codepoint.items())
+
+def _entity_to_char(m):
+    text = m.group(0)
+    try:
+        return ENTITY_CHARS[text]
+    except KeyError:
+        pass
+    if text[:2] == "&#":
+        # character reference
+        try:
+            if text[:3] == "&#x":
+                return unichr(int(text[3:-1], 16))
+            else:
+                return unichr(int(text[2:-1]))
+        except ValueError:
+            pass
+    return text # leave as is
 
 def from_xmlish_text(input_str):
     """
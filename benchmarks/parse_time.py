@@ -0,0 +1,45 @@
+"""
+Time the SRT and WebVTT parsers on inputs of growing size, including the
+pathological ones the tests check the regex calls for.  The time per cue
+(or per character) should stay about the same as the input grows.
+
+Run from the top of the checkout:
+
+    python benchmarks/parse_time.py
+"""
+
+import time
+
+from babelsubs.parsers.srt import SRTParser
+from babelsubs.parsers.webvtt import WEBVTTParser
+
+INPUTS = [
+    ('srt, long run of digits', SRTParser, lambda size:
+        u"1\n00:00:01,000 --> 00:00:02,000\nok\n\n" + u"1" * size * 5),
+    ('srt, no blank lines', SRTParser, lambda size:
+        u"1\n00:00:01,000 --> 00:00:02,000\ntext\n" * size),
+    ('srt, regular cues', SRTParser, lambda size:
+        u"1\n00:00:01,000 --> 00:00:02,000\ntext\n\n" * size),
+    ('vtt, long fraction', WEBVTTParser, lambda size:
+        u"WEBVTT\n\n00:01.000 --> 00:02.000\nok\n\n" +
+        u"00:00." + u"0" * size * 5),
+    ('vtt, no blank lines', WEBVTTParser, lambda size:
+        u"WEBVTT\n\n" + u"00:01.000 --> 00:02.000\ntext\n" * size),
+]
+
+def parse_time(parser_class, content, runs=3):
+    best = None
+    for i in xrange(runs):
+        start = time.time()
+        parser_class(content, 'en', eager_parse=False).to_internal()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == '__main__':
+    for name, parser_class, make_input in INPUTS:
+        print name
+        for size in (2000, 16000, 128000):
+            elapsed = parse_time(parser_class, make_input(size))
+            print "    %7d: %.4fs (%.2fus per unit)" % (
+                size, elapsed, elapsed * 1e6 / size)
@@ -0,0 +1,28 @@
+"""
+Compare the time utils.strip_tags() and bleach take to sanitize the test data.
+
+Needs bleach installed; run from the top of the checkout:
+
+    python benchmarks/strip_tags.py
+"""
+
+import time
+
+import bleach
+
+from babelsubs import utils
+from babelsubs.tests.test_utils import bleach_strip_tags, corpus
+
+def run(strip_tags, texts):
+    start = time.time()
+    for text in texts:
+        strip_tags(text)
+    return time.time() - start
+
+if __name__ == '__main__':
+    texts = corpus()[:300]
+    bleach_time = run(bleach_strip_tags, texts)
+    strip_tags_time = run(utils.strip_tags, texts)
+    print "bleach:     %.3fs" % bleach_time
+    print "strip_tags: %.3fs (%.1f times faster)" % (
+        strip_tags_time, bleach_time / max(strip_tags_time, 1e-6))
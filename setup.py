@@ -15,11 +15,7 @@ setup(
     setup_requires=[],
     install_requires=[
         'lxml==2.3',
-        'html5lib==0.95',
         'wsgiref==0.1.2',
     ],
-    dependency_links=[
-        'https://github.com/jsocol/bleachmastertarball/master#egg=bleach-dev'
-    ]
 
 )